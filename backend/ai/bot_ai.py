@@ -1,8 +1,28 @@
 # backend/ai/bot_ai.py
 
 import os
-import httpx
 import re
+import json
+import time
+import asyncio
+import logging
+import unicodedata
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import pytz
+
+from backend.aio import run_blocking
+from backend.database import get_cached_answer, store_cached_answer
+
+try:  # HTTP/2 optional է (pip install "httpx[http2]")
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 API_KEY = os.getenv("PERPLEXITY_API_KEY")
 if not API_KEY:
@@ -10,17 +30,231 @@ if not API_KEY:
 
 BASE_URL = "https://api.perplexity.ai/chat/completions"
 
+# Միաժամանակ upstream կանչերի սահմանը (rate limit-ից պաշտպանություն)
+PERPLEXITY_MAX_CONCURRENCY = int(os.getenv("PERPLEXITY_MAX_CONCURRENCY", "4"))
+PERPLEXITY_HTTP2 = os.getenv("PERPLEXITY_HTTP2", "1") == "1" and _HTTP2_AVAILABLE
+
+# Process-ի ընդհանուր keep-alive client (DNS/TCP/TLS մեկ անգամ)
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# normalized question -> ընթացիկ upstream կանչը (նույն հարցերը կիսում են մեկ կանչ)
+_in_flight: Dict[str, "asyncio.Task[str]"] = {}
+
+# Պատասխանների cache (SQLite, ai_answer_cache). TTL=0 → անջատված
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL_HOURS", "24")) * 3600
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000"))
+
+# Միայն article-ներ և "Մադրիդ"-ի ձևերը (բոլոր հարցերն էլ Մադրիդի մասին են).
+# Նախդիրները (sin/con, без/с, desde/hasta, para...), ժխտումները, հարցական և
+# ժամանակի բառերը մնում են key-ում, որովհետև փոխում են հարցի իմաստը:
+_STOP_WORDS = frozenset("""
+    мадрид мадриде мадрида мадриду мадридом
+    the a an
+    el la los las un una unos unas
+    madrid
+""".split())
+
+# «Այսօր / վաղը» տիպի հարցերի պատասխանները վավեր են միայն մինչև
+# Մադրիդի կեսգիշեր (key-ը նույնն է մնում, իսկ պատասխանը՝ ոչ)
+MADRID_TZ = pytz.timezone("Europe/Madrid")
+_TIME_WORDS = frozenset("""
+    сегодня сегодняшний сегодняшние завтра завтрашний вчера сейчас
+    выходные выходных
+    hoy manana ayer ahora noche finde
+    today tonight tomorrow yesterday now weekend
+""".split())
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _semaphore
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=30,
+            http2=PERPLEXITY_HTTP2,
+            limits=httpx.Limits(
+                max_connections=PERPLEXITY_MAX_CONCURRENCY,
+                max_keepalive_connections=PERPLEXITY_MAX_CONCURRENCY,
+                keepalive_expiry=60,
+            ),
+        )
+        _semaphore = asyncio.Semaphore(PERPLEXITY_MAX_CONCURRENCY)
+    return _client
+
+
+async def close_ai_client() -> None:
+    """
+    Փակում է ընդհանուր HTTP client-ը (shutdown-ի ժամանակ).
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _strip_accents(text: str) -> str:
+    """
+    Հանում է լատինական տառերի շեշտերը ("dónde" -> "donde").
+    Կիրիլիցան չենք փոխում (й-ն պետք է մնա й).
+    """
+    chars: List[str] = []
+    for ch in unicodedata.normalize("NFD", text):
+        if unicodedata.combining(ch) and chars and chars[-1].isascii():
+            continue
+        chars.append(ch)
+    return unicodedata.normalize("NFC", "".join(chars))
+
+
+def _question_key(question: str) -> str:
+    """
+    Հարցի normalized ձևը cache-ի և coalescing-ի key-ի համար.
+    case, կետադրություն, բացատներ, շեշտեր և stop-word-եր հանված:
+      "Где поесть пиццу в Мадриде?" -> "где поесть пиццу в"
+    """
+    text = _strip_accents(question.casefold().replace("ё", "е"))
+    words = _NON_WORD_RE.sub(" ", text).split()
+    meaningful = [w for w in words if w not in _STOP_WORDS]
+    # Եթե ամբողջը stop-word է, պահում ենք բառերը, որ key-ը դատարկ չլինի
+    return " ".join(meaningful or words)
+
+
+def _cache_max_age(key: str) -> float:
+    """
+    Cache-ի entry-ի առավելագույն տարիքը key-ի համար. ժամանակի բառով
+    հարցերի համար՝ ոչ ավելին, քան Մադրիդում այսօրվա կեսգիշերից անցածը.
+    """
+    if _TIME_WORDS.isdisjoint(key.split()):
+        return AI_CACHE_TTL
+    now = datetime.now(MADRID_TZ)
+    midnight = MADRID_TZ.localize(datetime.combine(now.date(), datetime.min.time()))
+    return min(AI_CACHE_TTL, (now - midnight).total_seconds())
+
+
+async def _cached_answer(key: str) -> Optional[str]:
+    if AI_CACHE_TTL <= 0:
+        return None
+    cached = await run_blocking(get_cached_answer, key, _cache_max_age(key))
+    if cached is None:
+        return None
+    answer, latency_ms = cached
+    logger.info("AI cache hit for %r (saved ~%.0f ms)", key, latency_ms)
+    return answer
+
+
+def _register_in_flight(key: str, future: "asyncio.Future[str]") -> None:
+    _in_flight[key] = future
+
+    def _done(done: "asyncio.Future[str]") -> None:
+        if _in_flight.get(key) is done:
+            _in_flight.pop(key, None)
+        if not done.cancelled():
+            done.exception()  # "exception was never retrieved"-ից խուսափելու համար
+
+    future.add_done_callback(_done)
+
+
+async def _store_answer(question: str, key: str, answer: str, started: float) -> None:
+    if AI_CACHE_TTL > 0 and answer:
+        latency_ms = (time.perf_counter() - started) * 1000
+        await run_blocking(
+            store_cached_answer,
+            key,
+            question,
+            answer,
+            latency_ms,
+            AI_CACHE_TTL,
+            AI_CACHE_MAX_ENTRIES,
+        )
+
 
 async def ask_city_bot(question: str) -> str:
     """
     AI assistant-ը Մադրիդի համար։
+    Նախ նայում ենք պատասխանների cache-ը (normalized հարցով),
+    իսկ միաժամանակ տրված նույն հարցերը կիսում են մեկ upstream կանչ։
+    """
+    key = _question_key(question)
+    cached = await _cached_answer(key)
+    if cached is not None:
+        return cached
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_ask_and_store(question, key))
+        _register_in_flight(key, task)
+    # shield՝ մեկ սպասողի cancel-ը չպետք է կանգնեցնի մյուսների կանչը
+    return await asyncio.shield(task)
+
+
+async def stream_city_bot(question: str) -> AsyncIterator[str]:
+    """
+    ask_city_bot-ի streaming տարբերակը։
+    yield է անում մինչ այդ ստացված պատասխանը (մաքրված), token առ token,
+    իսկ վերջին yield-ը արդեն ամբողջական, վերջնական պատասխանն է։
+    Cache hit-ի կամ նույն հարցի ընթացիկ կանչի դեպքում՝ մեկ yield։
+    """
+    key = _question_key(question)
+    cached = await _cached_answer(key)
+    if cached is not None:
+        yield cached
+        return
+
+    pending = _in_flight.get(key)
+    if pending is not None:
+        yield await asyncio.shield(pending)
+        return
+
+    # Future, որով նույն հարցը տվողները սպասում են այս stream-ի արդյունքին
+    future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+    _register_in_flight(key, future)
+    started = time.perf_counter()
+    parts: List[str] = []
+    try:
+        async for delta in _stream_upstream(question):
+            parts.append(delta)
+            yield _clean_answer("".join(parts))
+    except BaseException as e:
+        if not future.done():
+            if isinstance(e, Exception):
+                future.set_exception(e)
+            else:  # cancel / generator close
+                future.cancel()
+        raise
+
+    answer = _clean_answer("".join(parts))
+    future.set_result(answer)
+    await _store_answer(question, key, answer, started)
+    yield answer
+
+
+async def _ask_and_store(question: str, key: str) -> str:
+    started = time.perf_counter()
+    answer = await _ask_upstream(question)
+    await _store_answer(question, key, answer, started)
+    return answer
+
+
+def _clean_answer(text: str) -> str:
+    """
     Մաքրում է citation թվերը և կտրում է երկար պատասխանները։
     """
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-    }
+    # Մաքրել citation թվերը [1], [2], [3] և այլն
+    text = re.sub(r'\[\d+\]', '', text)
+
+    # Հեռացնել ավել բացատները
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip()
+
+    # Կտրել եթե չափից երկար է (Telegram-ի 4096 char limit-ից շատ փոքր)
+    if len(text) > 800:
+        text = text[:800] + "..."
+
+    return text
+
 
+def _build_request(question: str, stream: bool = False) -> dict:
     payload = {
         "model": "sonar",
         "messages": [
@@ -38,29 +272,65 @@ async def ask_city_bot(question: str) -> str:
         "temperature": 0.7,
         "max_tokens": 200,  # Կրճատել 300-ից 200
     }
+    if stream:
+        payload["stream"] = True
+    return {
+        "headers": {
+            "Authorization": f"Bearer {API_KEY}",
+            "Content-Type": "application/json",
+        },
+        "json": payload,
+    }
+
+
+async def _ask_upstream(question: str) -> str:
+    """
+    Մեկ կանչ Perplexity-ին։
+    """
+    client = _get_client()
+    async with _semaphore:
+        resp = await client.post(BASE_URL, **_build_request(question))
+
+    if resp.status_code >= 400:
+        logger.warning(
+            "Perplexity error status %s: %s", resp.status_code, resp.text[:500]
+        )
+
+    resp.raise_for_status()
+    data = resp.json()
+
+    # Վերցնել պատասխանը
+    return _clean_answer(data["choices"][0]["message"]["content"])
+
+
+async def _stream_upstream(question: str) -> AsyncIterator[str]:
+    """
+    Perplexity SSE stream (OpenAI ձևաչափ). yield է անում content delta-ները։
+    """
+    client = _get_client()
+    async with _semaphore:
+        async with client.stream(
+            "POST", BASE_URL, **_build_request(question, stream=True)
+        ) as resp:
+            if resp.status_code >= 400:
+                body = await resp.aread()
+                logger.warning(
+                    "Perplexity error status %s: %s",
+                    resp.status_code,
+                    body[:500].decode("utf-8", "replace"),
+                )
+            resp.raise_for_status()
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(BASE_URL, headers=headers, json=payload)
-
-        if resp.status_code >= 400:
-            print("Perplexity error status:", resp.status_code)
-            print("Perplexity error body:", resp.text)
-
-        resp.raise_for_status()
-        data = resp.json()
-        
-        # Վերցնել պատասխանը
-        text = data["choices"][0]["message"]["content"].strip()
-        
-        # Մաքրել citation թվերը [1], [2], [3] և այլն
-        text = re.sub(r'\[\d+\]', '', text)
-        
-        # Հեռացնել ավել բացատները
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        # Կտրել եթե չափից երկար է (Telegram-ի 4096 char limit-ից շատ փոքր)
-        if len(text) > 800:
-            text = text[:800] + "..."
-        
-        return text
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                    delta = chunk["choices"][0].get("delta") or {}
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if delta.get("content"):
+                    yield delta["content"]
@@ -1,47 +1,138 @@
 # backend/ai/response.py
 
-import threading
+import os
 import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from backend.aio import run_blocking
+from backend.database import (
+    queue_pending_question,
+    queue_pending_question_done,
+    load_pending_questions,
+    get_pending_question_message,
+)
+
+logger = logging.getLogger(__name__)
+
+# Максимум одновременно ожидающих вопросов; при переполнении вытесняется самый старый
+AUTORESPONDER_MAX_PENDING = int(os.getenv("AUTORESPONDER_MAX_PENDING", "10000"))
 
 # Главный контроллер для unanswered вопросов и их auto-response (русский комментарий)
 
 class QuestionAutoResponder:
-    def __init__(self, timeout=300):
-        self.pending_questions = {}  # {question_id: (user_id, message, timestamp)}
+    """
+    Таймеры на event loop (loop.call_later — heap внутри asyncio) вместо
+    отдельного потока со sleep на каждый вопрос. mark_answered отменяет
+    таймер за O(1), поиск выполняется в пуле потоков (run_blocking).
+    Вопросы сохраняются в SQLite (pending_questions) через write-behind буфер,
+    после рестарта restore() заново ставит таймеры. Текст сообщения в памяти
+    не держим — он читается из базы в момент автоответа.
+    """
+
+    def __init__(self, timeout=300, max_pending=AUTORESPONDER_MAX_PENDING):
+        self.pending_questions = OrderedDict()  # {question_id: (user_id, deadline, search_type)}
         self.timeout = timeout      # timeout секунд ожидания (например, 300 = 5 минут)
+        self.max_pending = max_pending
+        self._timers = {}           # {question_id: asyncio.TimerHandle}
+        self._tasks = set()         # запущенные автоответы (чтобы не собрал GC)
+        self.metrics = {
+            "added": 0, "answered": 0, "fired": 0, "failed": 0, "dropped": 0, "restored": 0,
+        }
 
     def add_question(self, user_id, message, question_id, search_type="food"):
-        now = time.time()
-        self.pending_questions[question_id] = (user_id, message, now, search_type)
-        threading.Thread(target=self._wait_and_respond, args=(question_id,)).start()
+        # Вызывается из aiogram handler-а, т.е. внутри работающего event loop
+        deadline = time.time() + self.timeout
+        self._arm(question_id, user_id, search_type, deadline)
+        queue_pending_question(question_id, user_id, message, search_type, deadline)
+        self.metrics["added"] += 1
+
+    async def restore(self):
+        """
+        После рестарта: одним запросом загружает неистёкшие вопросы
+        (истёкшие удаляются) и заново ставит их таймеры.
+        """
+        rows = await run_blocking(load_pending_questions)
+        for question_id, user_id, search_type, deadline in rows:
+            self._arm(question_id, user_id, search_type, deadline)
+        self.metrics["restored"] += len(rows)
+        logger.info("Restored %d pending auto-response questions", len(rows))
 
     def mark_answered(self, question_id):
-        if question_id in self.pending_questions:
-            del self.pending_questions[question_id]
-
-    def _wait_and_respond(self, question_id):
-        user_id, message, ts, search_type = self.pending_questions[question_id]
-        time.sleep(self.timeout)
-        if question_id in self.pending_questions:
-            # Вызываем нужный search-функционал по типу
-            if search_type == "food":
-                from backend.ai.food_reply import find_food_place
-                result = find_food_place(message)
-            elif search_type == "item":
-                from backend.ai.item_match import find_item_offer
-                result = find_item_offer(message)
-            elif search_type == "weather":
-                from backend.ai.weather_morning import get_weather_forecast
-                result = get_weather_forecast()
-            elif search_type == "traffic":
-                from backend.ai.traffic import get_traffic_status
-                result = get_traffic_status()
-            else:
-                result = "Не могу найти результат по вашему запросу."
-
-            reply = f"Автоответ:\n{result}"
-            send_telegram_message(user_id, reply)
-            self.mark_answered(question_id)
+        if self._cancel(question_id):
+            queue_pending_question_done(question_id)
+            self.metrics["answered"] += 1
+
+    def stats(self):
+        return {"pending": len(self.pending_questions), **self.metrics}
+
+    def _arm(self, question_id, user_id, search_type, deadline):
+        loop = asyncio.get_running_loop()
+        self._cancel(question_id)
+
+        while len(self.pending_questions) >= self.max_pending:
+            oldest_id, _ = self.pending_questions.popitem(last=False)
+            self._timers.pop(oldest_id).cancel()
+            queue_pending_question_done(oldest_id)
+            self.metrics["dropped"] += 1
+
+        self.pending_questions[question_id] = (user_id, deadline, search_type)
+        delay = max(deadline - time.time(), 0)
+        self._timers[question_id] = loop.call_later(delay, self._fire, question_id)
+
+    def _cancel(self, question_id):
+        timer = self._timers.pop(question_id, None)
+        if timer is None:
+            return False
+        timer.cancel()
+        del self.pending_questions[question_id]
+        return True
+
+    def _fire(self, question_id):
+        self._timers.pop(question_id, None)
+        entry = self.pending_questions.pop(question_id, None)
+        if entry is None:
+            return
+        self.metrics["fired"] += 1
+        user_id, _deadline, search_type = entry
+        task = asyncio.get_running_loop().create_task(
+            self._respond(question_id, user_id, search_type)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _respond(self, question_id, user_id, search_type):
+        try:
+            message = await run_blocking(get_pending_question_message, question_id)
+            queue_pending_question_done(question_id)
+            if message is None:
+                return
+            result = await run_blocking(_search, search_type, message)
+        except Exception as e:
+            self.metrics["failed"] += 1
+            logger.error("Auto-response search failed (%s): %s", search_type, e, exc_info=True)
+            return
+
+        reply = f"Автоответ:\n{result}"
+        send_telegram_message(user_id, reply)
+
+
+def _search(search_type, message):
+    # Вызываем нужный search-функционал по типу
+    if search_type == "food":
+        from backend.ai.food_reply import find_food_place
+        return find_food_place(message)
+    elif search_type == "item":
+        from backend.ai.item_match import find_item_offer
+        return find_item_offer(message)
+    elif search_type == "weather":
+        from backend.ai.weather_morning import get_weather_forecast
+        return get_weather_forecast()
+    elif search_type == "traffic":
+        from backend.ai.traffic import get_traffic_status
+        return get_traffic_status()
+    return "Не могу найти результат по вашему запросу."
 
 def send_telegram_message(user_id, text):
     # Здесь бот отправляет сообщение через aiogram/bot.send_message
@@ -1,8 +1,80 @@
 import os
-import requests
+import time
+import asyncio
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") or "CHANGE_ME"
 
+# Базовый URL Google Maps API (можно указать локальный stub-сервер)
+GOOGLE_MAPS_BASE_URL = os.getenv(
+    "GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api"
+).rstrip("/")
+DIRECTIONS_URL = f"{GOOGLE_MAPS_BASE_URL}/directions/json"
+DISTANCE_MATRIX_URL = f"{GOOGLE_MAPS_BASE_URL}/distancematrix/json"
+
+# directions — отдельный запрос на каждый маршрут,
+# matrix — один Distance Matrix запрос на направление (в центр / из центра)
+TRAFFIC_ENGINE = os.getenv("TRAFFIC_ENGINE", "directions").strip().lower()
+
+# Сколько секунд результат по маршруту считается свежим
+# (утренний дайджест и /traffic используют одни и те же данные)
+TRAFFIC_CACHE_TTL = float(os.getenv("TRAFFIC_CACHE_TTL", "300"))
+
+# (origin, destination, подпись)
+ROUTES_IN = [
+    ("M-30 Norte, Madrid", "Centro, Madrid", "M‑30 Norte → центр"),
+    ("A-6, Madrid", "Centro, Madrid", "A‑6 → центр"),
+    ("A-3, Madrid", "Centro, Madrid", "A‑3 → центр"),
+    ("A-2, Madrid", "Centro, Madrid", "A‑2 → центр"),
+    ("A-5, Madrid", "Centro, Madrid", "A‑5 → центр"),
+    ("A-4, Madrid", "Centro, Madrid", "A‑4 → центр"),
+]
+
+ROUTES_OUT = [
+    ("Centro, Madrid", "A-6, Madrid", "центр → A‑6"),
+    ("Centro, Madrid", "A-3, Madrid", "центр → A‑3"),
+    ("Centro, Madrid", "A-2, Madrid", "центр → A‑2"),
+    ("Centro, Madrid", "A-5, Madrid", "центр → A‑5"),
+    ("Centro, Madrid", "A-4, Madrid", "центр → A‑4"),
+    ("Paseo de la Castellana, Madrid", "M-30 Norte, Madrid", "центр → M‑30 Norte"),
+]
+
+# Общий keep-alive клиент для всех запросов к Google
+_client: httpx.AsyncClient | None = None
+
+# {key: (expires_at, task)}; task общий для одновременных запросов
+_route_cache: dict = {}
+
+# Счётчик запросов к Google API по типу (для сравнения движков)
+_api_calls = {"directions": 0, "distancematrix": 0}
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        )
+    return _client
+
+
+def get_traffic_api_stats() -> dict:
+    """Сколько запросов к Google API сделано с момента старта."""
+    return dict(_api_calls)
+
+
+async def close_traffic_client() -> None:
+    """Закрывает общий HTTP клиент (при shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 def _compute_speed_kmh(leg) -> float | None:
     """Возвращает среднюю скорость по участку в км/ч или None, если данных нет."""
     distance_m = leg.get("distance", {}).get("value")
@@ -52,12 +124,10 @@ def _score_to_icon(score: int) -> str:
     return "🟥"
 
 
-def _get_road_status(origin: str, destination: str):
+async def _fetch_road_status(origin: str, destination: str):
     """
     Возвращает (название дороги, score 0–10) или None, если данных нет.
     """
-    url = "https://maps.googleapis.com/maps/api/directions/json"
-
     params = {
         "origin": origin,
         "destination": destination,
@@ -68,21 +138,24 @@ def _get_road_status(origin: str, destination: str):
     }
 
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        _api_calls["directions"] += 1
+        resp = await _get_client().get(DIRECTIONS_URL, params=params)
         data = resp.json()
-    except Exception:
-        return None
+        routes = data.get("routes", [])
+        if not routes:
+            return None
 
-    routes = data.get("routes", [])
-    if not routes:
+        # Разбор ответа тоже внутри try: неполный JSON = нет данных, а не исключение
+        leg = routes[0]["legs"][0]
+        speed_kmh = _compute_speed_kmh(leg)
+        summary = routes[0].get("summary", "")
+    except Exception as e:
+        logger.warning("Directions request failed (%s → %s): %s", origin, destination, e)
         return None
 
-    leg = routes[0]["legs"][0]
-    speed_kmh = _compute_speed_kmh(leg)
     if speed_kmh is None:
         return None
 
-    summary = routes[0].get("summary", "")
     if not summary:
         return None
 
@@ -90,49 +163,133 @@ def _get_road_status(origin: str, destination: str):
     return summary, score
 
 
-def madrid_morning_traffic():
+async def _fetch_matrix_statuses(routes) -> list:
     """
-    Возвращает одно–два коротких сообщения о пробках на основных трассах:
-    одна таблица «В ЦЕНТР», вторая — «ИЗ ЦЕНТРА».
-    Формат строки:
-      🟠 6/10 — M‑30 Norte → центр
+    Один Distance Matrix запрос на все маршруты направления:
+    origins = уникальные origin-ы, destinations = уникальные destination-ы.
+    Возвращает список (название, score) / None в порядке routes.
     """
-    routes_in = [
-        ("M-30 Norte, Madrid", "Centro, Madrid", "M‑30 Norte → центр"),
-        ("A-6, Madrid", "Centro, Madrid", "A‑6 → центр"),
-        ("A-3, Madrid", "Centro, Madrid", "A‑3 → центр"),
-        ("A-2, Madrid", "Centro, Madrid", "A‑2 → центр"),
-        ("A-5, Madrid", "Centro, Madrid", "A‑5 → центр"),
-        ("A-4, Madrid", "Centro, Madrid", "A‑4 → центр"),
-    ]
-
-    routes_out = [
-        ("Centro, Madrid", "A-6, Madrid", "центр → A‑6"),
-        ("Centro, Madrid", "A-3, Madrid", "центр → A‑3"),
-        ("Centro, Madrid", "A-2, Madrid", "центр → A‑2"),
-        ("Centro, Madrid", "A-5, Madrid", "центр → A‑5"),
-        ("Centro, Madrid", "A-4, Madrid", "центр → A‑4"),
-        ("Paseo de la Castellana, Madrid", "M-30 Norte, Madrid", "центр → M‑30 Norte"),
-    ]
-
-    lines_in: list[str] = []
-    lines_out: list[str] = []
-
-    for origin, dest, label in routes_in:
-        status = _get_road_status(origin, dest)
-        if not status:
+    origins = list(dict.fromkeys(origin for origin, _dest, _label in routes))
+    destinations = list(dict.fromkeys(dest for _origin, dest, _label in routes))
+    params = {
+        "origins": "|".join(origins),
+        "destinations": "|".join(destinations),
+        "key": GOOGLE_API_KEY,
+        "departure_time": "now",
+        "region": "es",
+        "mode": "driving",
+    }
+
+    try:
+        _api_calls["distancematrix"] += 1
+        resp = await _get_client().get(DISTANCE_MATRIX_URL, params=params)
+        data = resp.json()
+        rows = data["rows"]
+    except Exception as e:
+        logger.warning("Distance Matrix request failed: %s", e)
+        return [None] * len(routes)
+
+    statuses = []
+    for origin, dest, _label in routes:
+        try:
+            element = rows[origins.index(origin)]["elements"][destinations.index(dest)]
+            # У ячейки матрицы те же поля, что у leg в Directions
+            speed_kmh = _compute_speed_kmh(element) if element.get("status") == "OK" else None
+        except (LookupError, TypeError, AttributeError):
+            statuses.append(None)
             continue
-        road_name, score = status
-        icon = _score_to_icon(score)
-        lines_in.append(f"{icon} {score}/10 — {label}")
+        if speed_kmh is None:
+            statuses.append(None)
+            continue
+        statuses.append((f"{origin} → {dest}", _speed_to_score(speed_kmh)))
+    return statuses
+
 
-    for origin, dest, label in routes_out:
-        status = _get_road_status(origin, dest)
+async def _cached(key, factory, is_empty):
+    """
+    Результат factory() с кэшем на TRAFFIC_CACHE_TTL секунд.
+    Одновременные запросы с одним ключом ждут один и тот же вызов.
+    Пустые результаты и упавшие задачи не кэшируются.
+    """
+    now = time.monotonic()
+    entry = _route_cache.get(key)
+    if entry is None or entry[0] <= now:
+        task = asyncio.ensure_future(factory())
+        entry = (now + TRAFFIC_CACHE_TTL, task)
+        _route_cache[key] = entry
+
+    try:
+        result = await asyncio.shield(entry[1])
+    except BaseException:
+        # Задача упала или отменена → следующий запрос делает новый вызов.
+        # Если отменили только ожидающего (задача ещё идёт), кэш не трогаем
+        if entry[1].done() and _route_cache.get(key) is entry:
+            _route_cache.pop(key, None)
+        raise
+    if is_empty(result) and _route_cache.get(key) is entry:
+        _route_cache.pop(key, None)
+    return result
+
+
+async def _get_road_status(origin: str, destination: str):
+    """
+    _fetch_road_status с кэшем (см. _cached).
+    """
+    return await _cached(
+        (origin, destination),
+        lambda: _fetch_road_status(origin, destination),
+        lambda status: status is None,
+    )
+
+
+async def _get_matrix_statuses(routes) -> list:
+    """
+    _fetch_matrix_statuses с кэшем (см. _cached).
+    """
+    return await _cached(
+        ("matrix", tuple(routes)),
+        lambda: _fetch_matrix_statuses(routes),
+        lambda statuses: not any(statuses),
+    )
+
+
+async def _route_statuses(engine: str):
+    """(statuses для ROUTES_IN, statuses для ROUTES_OUT) выбранным движком."""
+    if engine == "matrix":
+        return await asyncio.gather(
+            _get_matrix_statuses(ROUTES_IN), _get_matrix_statuses(ROUTES_OUT)
+        )
+
+    routes = ROUTES_IN + ROUTES_OUT
+    statuses = await asyncio.gather(
+        *(_get_road_status(origin, dest) for origin, dest, _label in routes)
+    )
+    return statuses[:len(ROUTES_IN)], statuses[len(ROUTES_IN):]
+
+
+def _format_lines(routes, statuses) -> list[str]:
+    lines = []
+    for (origin, dest, label), status in zip(routes, statuses):
         if not status:
             continue
         road_name, score = status
         icon = _score_to_icon(score)
-        lines_out.append(f"{icon} {score}/10 — {label}")
+        lines.append(f"{icon} {score}/10 — {label}")
+    return lines
+
+
+async def madrid_morning_traffic():
+    """
+    Возвращает одно–два коротких сообщения о пробках на основных трассах:
+    одна таблица «В ЦЕНТР», вторая — «ИЗ ЦЕНТРА».
+    Все маршруты запрашиваются параллельно (≈ один round-trip).
+    Формат строки:
+      🟠 6/10 — M‑30 Norte → центр
+    """
+    statuses_in, statuses_out = await _route_statuses(TRAFFIC_ENGINE)
+
+    lines_in = _format_lines(ROUTES_IN, statuses_in)
+    lines_out = _format_lines(ROUTES_OUT, statuses_out)
 
     messages: list[str] = []
 
@@ -145,3 +302,76 @@ def madrid_morning_traffic():
         messages.append(msg_out)
 
     return messages
+
+
+if __name__ == "__main__":
+    # Сравнение движков на локальном stub-сервере (без Google API):
+    # одинаковые ли строки дайджеста и сколько запросов уходит.
+    #   python -m backend.ai.traffic
+    import zlib
+    from aiohttp import web
+
+    def _stub_cell(origin, dest):
+        # Детерминированные distance/duration для пары, общие для обоих endpoint-ов
+        seed = zlib.crc32(f"{origin}|{dest}".encode())
+        distance_m = 5000 + seed % 15000
+        speed_kmh = 4 + seed % 70
+        duration_s = int(distance_m / 1000 / speed_kmh * 3600)
+        return {
+            "status": "OK",
+            "distance": {"value": distance_m},
+            "duration": {"value": duration_s},
+            "duration_in_traffic": {"value": duration_s},
+        }
+
+    async def _stub_directions(request):
+        cell = _stub_cell(request.query["origin"], request.query["destination"])
+        return web.json_response({"routes": [{"summary": "stub", "legs": [cell]}]})
+
+    async def _stub_matrix(request):
+        origins = request.query["origins"].split("|")
+        destinations = request.query["destinations"].split("|")
+        return web.json_response({
+            "rows": [
+                {"elements": [_stub_cell(o, d) for d in destinations]}
+                for o in origins
+            ],
+        })
+
+    async def _compare():
+        global DIRECTIONS_URL, DISTANCE_MATRIX_URL
+        app = web.Application()
+        app.router.add_get("/directions/json", _stub_directions)
+        app.router.add_get("/distancematrix/json", _stub_matrix)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        port = runner.addresses[0][1]
+        DIRECTIONS_URL = f"http://127.0.0.1:{port}/directions/json"
+        DISTANCE_MATRIX_URL = f"http://127.0.0.1:{port}/distancematrix/json"
+
+        results = {}
+        for engine in ("directions", "matrix"):
+            _route_cache.clear()
+            before = get_traffic_api_stats()
+            started = time.perf_counter()
+            statuses_in, statuses_out = await _route_statuses(engine)
+            elapsed = (time.perf_counter() - started) * 1000
+            after = get_traffic_api_stats()
+            calls = {k: after[k] - before[k] for k in after}
+            results[engine] = (
+                _format_lines(ROUTES_IN, statuses_in) + _format_lines(ROUTES_OUT, statuses_out)
+            )
+            print(f"{engine:>10}: {calls} in {elapsed:.1f} ms")
+
+        for line in results["matrix"]:
+            print("  ", line)
+        same = results["directions"] == results["matrix"]
+        print("same scores:", same)
+
+        await close_traffic_client()
+        await runner.cleanup()
+        if not same:
+            raise SystemExit(1)
+
+    asyncio.run(_compare())
@@ -0,0 +1,95 @@
+# backend/aio.py
+
+import os
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Blocking DB / HTTP կանչերի thread pool-ի չափը (env-ով փոխելի).
+# Bounded է, որպեսզի ծանրաբեռնվածության ժամանակ չբացենք անվերջ thread
+# և connection (PG pool-ը նույնպես սահմանափակ է).
+BLOCKING_MAX_WORKERS = int(os.getenv("BLOCKING_MAX_WORKERS", "8"))
+
+# Event loop-ի lag-ի շեմը (ms), որից բարձր լինելու դեպքում log ենք անում
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# LOOP_DEBUG=1 → asyncio debug mode՝ log է անում կոնկրետ callback-ը,
+# որը բլոկավորել է loop-ը շեմից երկար (ավելի թանկ է, միայն debug-ի համար)
+LOOP_DEBUG = os.getenv("LOOP_DEBUG", "0") == "1"
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=BLOCKING_MAX_WORKERS,
+            thread_name_prefix="blocking-io",
+        )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Կատարում է sync (blocking) ֆունկցիան առանձին thread pool-ում,
+    որ aiogram-ի event loop-ը չկանգնի:
+      events = await run_blocking(get_upcoming_cinema_events, limit=2)
+    contextvars-ը փոխանցվում են (ինչպես asyncio.to_thread-ում).
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+def shutdown_blocking_executor() -> None:
+    """
+    Սպասում է ընթացիկ blocking կանչերին և փակում thread pool-ը (shutdown-ի ժամանակ).
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def monitor_loop_lag(
+    interval: float = LOOP_LAG_INTERVAL,
+    threshold_ms: float = LOOP_LAG_THRESHOLD_MS,
+) -> None:
+    """
+    Ամեն `interval` վայրկյանը մեկ չափում է, թե որքան ուշ է արթնանում
+    (sleep-ի drift). Եթե ուշացումը threshold_ms-ից մեծ է, ինչ-որ callback
+    բլոկավորել է loop-ը → warning log.
+    """
+    loop = asyncio.get_running_loop()
+    if LOOP_DEBUG:
+        loop.set_debug(True)
+        loop.slow_callback_duration = threshold_ms / 1000
+
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms = (time.perf_counter() - started - interval) * 1000
+        if lag_ms > threshold_ms:
+            logger.warning(
+                "Event loop blocked for ~%.0f ms (threshold %.0f ms)",
+                lag_ms,
+                threshold_ms,
+            )
+
+
+def start_loop_monitor() -> asyncio.Task:
+    """
+    Սկսում է monitor_loop_lag()-ը background task-ով (կանչել loop-ի ներսից).
+    """
+    return asyncio.create_task(monitor_loop_lag(), name="loop-lag-monitor")
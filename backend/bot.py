@@ -4,34 +4,40 @@
 #  IMPORTS & INITIAL SETUP
 # ==========================
 import os
+import time
+import signal
 import asyncio
 import logging
+import multiprocessing
 
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from dotenv import load_dotenv
 
-from backend.ai.bot_ai import ask_city_bot
+from backend.ai.bot_ai import ask_city_bot, stream_city_bot, close_ai_client
 
 from backend.languages import LANG, detect_lang
-from backend.jobs import add_offer, add_request, find_matches, init_jobs_schema
-from backend.database import init_db
+from backend.jobs import add_offer, add_request, get_matches, init_jobs_schema
+from backend.database import init_db, close_connections, stop_write_behind
+from backend.pg_pool import close_pool
+from backend.aio import run_blocking, shutdown_blocking_executor, start_loop_monitor
 from backend.memory import save_message_with_analysis
 from backend.matching import (
     parse_housing_offer,
+    save_housing_listing,
     find_matching_requests,
     find_matching_offers,
     is_housing_offer,
     is_housing_request,
 )
-from backend.events import get_upcoming_cinema_events
-from backend.events import _get_conn
+from backend.events import get_upcoming_cinema_events, get_events_by_category
 from backend.ai.response import QuestionAutoResponder
-from backend.ai.traffic import madrid_morning_traffic
+from backend.ai.traffic import madrid_morning_traffic, close_traffic_client
 from backend.news import (
     build_city_overview_message,
     build_cinema_message,
@@ -157,6 +163,23 @@ async def help_cmd(message: types.Message):
     logger.info(f"User {message.from_user.id} requested help")
 
 
+@dp.message(Command("traffic"))
+async def traffic_cmd(message: types.Message):
+    # Նույն route cache-ը, ինչ առավոտյան digest-ը (TRAFFIC_CACHE_TTL)
+    try:
+        traffic_msgs = await madrid_morning_traffic()
+    except Exception as e:
+        logger.error(f"Traffic error: {e}", exc_info=True)
+        traffic_msgs = []
+
+    if not traffic_msgs:
+        await message.answer("🚗 Данные о пробках сейчас недоступны.")
+        return
+
+    await message.answer("\n\n".join(traffic_msgs), parse_mode="Markdown")
+    logger.info(f"User {message.from_user.id} requested traffic")
+
+
 # ==========================
 #  🤖 БОТ — AI / ՀԻՄՆԱԿԱՆ ՕԳՆԱԿԱՆ
 # ==========================
@@ -197,14 +220,17 @@ async def bot_mode_chat(message: types.Message, state: FSMContext):
         text,
     )
 
-    await message.answer("Ищу для вас варианты и подсказки…")
+    status = await message.answer("Ищу для вас варианты и подсказки…")
 
     try:
-        answer_text = await ask_city_bot(text)
-
-        if answer_text:
-            await message.answer(answer_text)
+        if AI_STREAMING:
+            answer_text = await _stream_answer(status, text)
         else:
+            answer_text = await ask_city_bot(text)
+            if answer_text:
+                await message.answer(answer_text)
+
+        if not answer_text:
             await message.answer(
                 "Пока не нашёл подходящих вариантов. "
                 "Попробуйте сформулировать вопрос иначе."
@@ -217,6 +243,71 @@ async def bot_mode_chat(message: types.Message, state: FSMContext):
         )
 
 
+# Streaming պատասխան՝ մեկ message-ի edit-ով (AI_STREAMING=0 → ամբողջականը մեկ անգամից)
+AI_STREAMING = os.getenv("AI_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = int(os.getenv("STREAM_EDIT_INTERVAL_MS", "700")) / 1000
+STREAM_EDIT_MIN_CHARS = int(os.getenv("STREAM_EDIT_MIN_CHARS", "80"))
+STREAM_FINAL_EDIT_ATTEMPTS = 3
+
+
+async def _stream_answer(status: types.Message, question: str) -> str:
+    """
+    Token առ token ստացված պատասխանը ցույց է տալիս status message-ում.
+    edit_message_text-ը throttled է (STREAM_EDIT_INTERVAL կամ
+    STREAM_EDIT_MIN_CHARS նոր սիմվոլ), վերջում՝ մաքրված ամբողջական տեքստը.
+    """
+    shown = ""
+    last_edit = 0.0
+    blocked_until = 0.0     # flood wait-ի ավարտը (TelegramRetryAfter)
+    answer = ""
+
+    async def edit(text: str) -> bool:
+        """True, եթե text-ը հիմա երևում է message-ում."""
+        nonlocal shown, last_edit, blocked_until
+        try:
+            await status.edit_text(text)
+        except TelegramRetryAfter as e:
+            # Flood limit՝ retry_after վայրկյան edit չենք անում
+            blocked_until = time.monotonic() + e.retry_after
+            logger.debug("Stream edit rate limited for %ss", e.retry_after)
+            return False
+        except TelegramBadRequest as e:
+            # Միայն "message is not modified"-ն է նշանակում, որ text-ը արդեն երևում է
+            if "message is not modified" not in str(e):
+                logger.warning("Stream edit failed: %s", e)
+                return False
+        shown = text
+        last_edit = time.monotonic()
+        return True
+
+    async for answer in stream_city_bot(question):
+        if not answer or answer == shown:
+            continue
+        if time.monotonic() < blocked_until:
+            continue
+        if (
+            time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL
+            or len(answer) - len(shown) >= STREAM_EDIT_MIN_CHARS
+        ):
+            await edit(answer)
+
+    if answer and answer != shown:
+        # Վերջնական պատասխանը պետք է անպայման երևա՝ սպասում ենք flood wait-ին,
+        # իսկ եթե edit-ը չի ստացվում՝ ուղարկում ենք նոր message-ով
+        for _attempt in range(STREAM_FINAL_EDIT_ATTEMPTS):
+            wait = blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if await edit(answer):
+                break
+            if time.monotonic() >= blocked_until:
+                # Ոչ flood error (message too long / deleted) — retry-ն չի օգնի
+                break
+        if answer != shown:
+            await status.answer(answer)
+    return answer
+
+
 # ==========================
 #  📰 НОВОСТИ — EVENTS / КИНО / ТЕАТР / БАРЫ / МЕРОПРИЯТИЯ
 # ==========================
@@ -243,8 +334,8 @@ async def news_cmd(message: types.Message):
     Краткий обзор + кино (по 2 события максимум).
     """
     try:
-        overview = build_city_overview_message()
-        cinema = build_cinema_message(max_items=2)
+        overview = await run_blocking(build_city_overview_message)
+        cinema = await run_blocking(build_cinema_message, max_items=2)
 
         parts = []
         if overview:
@@ -271,7 +362,7 @@ async def news_cmd(message: types.Message):
 @dp.message(F.text == "🎬 Кино")
 async def news_cinema(message: types.Message):
     try:
-        events = get_upcoming_cinema_events(limit=2)
+        events = await run_blocking(get_upcoming_cinema_events, limit=2)
         if not events:
             await message.answer("🎬 На сегодня не найдено событий категории «Кино».")
             return
@@ -357,7 +448,7 @@ CATEGORY_LABELS = {
 @dp.message(F.text == "🍷 Бары и рестораны / Bares y restaurantes")
 async def news_bars(message: types.Message):
     try:
-        restaurants = build_restaurant_message(max_items=2)
+        restaurants = await run_blocking(build_restaurant_message, max_items=2)
         if not restaurants:
             await message.answer(
                 "🍷 На сегодня не найдено событий в барах и ресторанах."
@@ -379,7 +470,7 @@ async def news_bars(message: types.Message):
 @dp.message(F.text == "🎉 Мероприятия / Eventos")
 async def news_events(message: types.Message):
     try:
-        holidays = build_holidays_message(max_items=2)
+        holidays = await run_blocking(build_holidays_message, max_items=2)
         if not holidays:
             await message.answer(
                 "🎉 На сегодня не найдено городских мероприятий и праздников."
@@ -396,41 +487,10 @@ async def news_events(message: types.Message):
         await message.answer("🎉 Раздел «Мероприятия» временно недоступен.")
 
 
-async def _fetch_events_by_category(category: str, limit: int = 3):
-    sql = """
-        SELECT title, place, date, start_time, source_url, address, price, image_url
-        FROM madrid_events
-        WHERE category = %s
-        ORDER BY date, start_time
-        LIMIT %s;
-    """
-    events = []
-    try:
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute(sql, (category, limit))
-        rows = cur.fetchall()
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error fetching events for category={category}: {e}", exc_info=True)
-        return events
-
-    for title, place, date, start_time, source_url, address, price, image_url in rows:
-        date_str = str(date)
-        time_str = start_time or ""
-        events.append(
-            {
-                "title": title or "",
-                "place": place or "",
-                "date": date_str,
-                "time": time_str,
-                "link": source_url or "",
-                "address": address or "",
-                "price": price or "",
-                "image_url": image_url or "",
-            }
-        )
-    return events
+def _fetch_events_by_category(category: str, limit: int = 3):
+    # Կարդում է events cache-ից (DB միայն cache miss-ի դեպքում).
+    # Blocking է → handler-ներից կանչել run_blocking-ով.
+    return get_events_by_category(category, limit=limit)
 
 @dp.callback_query(F.data.startswith("madrid_show:"))
 async def handle_madrid_show_callback(callback: types.CallbackQuery):
@@ -450,7 +510,7 @@ async def handle_madrid_show_callback(callback: types.CallbackQuery):
         return
 
     label = CATEGORY_LABELS.get(slug, "Шоу")
-    events = await _fetch_events_by_category(slug, limit=2)
+    events = await run_blocking(_fetch_events_by_category, slug, limit=2)
 
     if not events:
         await callback.answer("Пока нет событий в этой категории.", show_alert=True)
@@ -543,7 +603,7 @@ async def offer_cmd(message: types.Message):
             LANG[lang].get("empty_offer", "Please provide offer details")
         )
         return
-    add_offer(message.from_user, text)
+    await run_blocking(add_offer, message.from_user, text)
     await message.answer(LANG[lang]["offer_saved"])
     logger.info(f"User {message.from_user.id} added offer: {text[:50]}")
 
@@ -556,26 +616,35 @@ async def request_cmd(message: types.Message):
             LANG[lang].get("empty_request", "Please provide request details")
         )
         return
-    add_request(message.from_user, text)
+    await run_blocking(add_request, message.from_user, text)
     await message.answer(LANG[lang]["request_saved"])
     logger.info(f"User {message.from_user.id} added request: {text[:50]}")
 
+MATCHES_PER_PAGE = 5
+
 @dp.message(Command("match"))
-async def match_cmd(message: types.Message):
+async def match_cmd(message: types.Message, command: CommandObject):
     lang = detect_lang(message.from_user.language_code)
-    matches = find_matches()
+    # /match 2 — երկրորդ էջը
+    page = int(command.args) if command.args and command.args.strip().isdigit() else 1
+    page = max(page, 1)
+    matches = await run_blocking(
+        get_matches, limit=MATCHES_PER_PAGE, offset=(page - 1) * MATCHES_PER_PAGE
+    )
     if not matches:
         await message.answer(LANG[lang]["no_matches"])
         return
 
     msg = LANG[lang]["matches"] + "\n\n"
-    for req, off in matches[:5]:
+    for req, off in matches:
         msg += (
             f"👤 **Request:** {req['text'][:100]}...\n"
             f"💼 **Offer:** {off['text'][:100]}...\n---\n"
         )
     await message.answer(msg, parse_mode="Markdown")
-    logger.info(f"User {message.from_user.id} checked matches: {len(matches)} found")
+    logger.info(
+        f"User {message.from_user.id} checked matches page {page}: {len(matches)} shown"
+    )
 
 # ==========================
 #  WELCOME ՆՈՐ ՄԱՍՆԱԿԻՑՆԵՐԻ
@@ -697,7 +766,9 @@ async def handle_message(message: types.Message):
     if message.text.startswith("/"):
         return
     
-    keywords = save_message_with_analysis(message.from_user.id, message.text)
+    keywords = await run_blocking(
+        save_message_with_analysis, message.from_user.id, message.text
+    )
     question_id = str(message.message_id)
     user_id = message.from_user.id
 
@@ -713,7 +784,10 @@ async def handle_message(message: types.Message):
     if keywords.get("housing"):
         if is_housing_offer(message.text):
             offer_data = parse_housing_offer(message.text)
-            matches = find_matching_requests(offer_data)
+            await run_blocking(save_housing_listing, user_id, "offer", offer_data)
+            matches = await run_blocking(
+                find_matching_requests, offer_data, exclude_telegram_id=user_id
+            )
             if matches:
                 match_count = len(matches)
                 await message.reply(
@@ -723,7 +797,10 @@ async def handle_message(message: types.Message):
                 )
         elif is_housing_request(message.text):
             request_data = parse_housing_offer(message.text)
-            matches = find_matching_offers(request_data)
+            await run_blocking(save_housing_listing, user_id, "request", request_data)
+            matches = await run_blocking(
+                find_matching_offers, request_data, exclude_telegram_id=user_id
+            )
             if matches:
                 match_count = len(matches)
                 await message.reply(
@@ -736,6 +813,118 @@ async def handle_message(message: types.Message):
 #  MAIN & SCHEDULER START
 # ==========================
 
+# polling (default) կամ webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+
+# Webhook mode-ի կարգավորումներ
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")          # public base URL, օր. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")    # X-Telegram-Bot-Api-Secret-Token (webhook-ում պարտադիր)
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("PORT", "8080"))
+# Քանի process լսի նույն port-ը (SO_REUSEPORT, kernel-ը բաշխում է connection-ները).
+# FSM state-ը (MemoryStorage) ամեն process-ում առանձին է.
+WEBHOOK_WORKERS = max(int(os.getenv("WEBHOOK_WORKERS", "1")), 1)
+
+
+async def _close_resources() -> None:
+    shutdown_blocking_executor()
+    stop_write_behind()
+    close_connections()
+    close_pool()
+    await close_ai_client()
+    await close_traffic_client()
+
+
+async def _serve_webhook(worker_index: int) -> None:
+    """
+    aiohttp server Telegram webhook-ի համար.
+    Update-ը ստանալուն պես պատասխանում ենք 200 և մշակում background-ում
+    (handle_in_background). Secret token-ը ստուգում է SimpleRequestHandler-ը.
+    Միայն worker 0-ն է գրանցում webhook-ը Telegram-ում.
+    """
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    app.router.add_get("/health", health)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(
+        runner, WEBAPP_HOST, WEBAPP_PORT, reuse_port=WEBHOOK_WORKERS > 1
+    )
+    await site.start()
+    logger.info(
+        "Webhook worker %d listening on %s:%d%s",
+        worker_index,
+        WEBAPP_HOST,
+        WEBAPP_PORT,
+        WEBHOOK_PATH,
+    )
+
+    if worker_index == 0:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=max(40, 10 * WEBHOOK_WORKERS),
+        )
+
+    # SIGTERM / SIGINT → կանոնավոր shutdown (write-behind buffer-ը flush է լինում)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+def _webhook_worker(worker_index: int) -> None:
+    """
+    Լրացուցիչ webhook process-ի entry point (spawn).
+    Schema-ն և scheduler-ը արդեն main process-ում են.
+    """
+    async def run() -> None:
+        lag_monitor = start_loop_monitor()
+        try:
+            await _serve_webhook(worker_index)
+        finally:
+            lag_monitor.cancel()
+            await _close_resources()
+
+    asyncio.run(run())
+
+
+def _spawn_webhook_workers() -> list:
+    if WEBHOOK_WORKERS > 1:
+        logger.warning(
+            "WEBHOOK_WORKERS=%d: FSM state (bot mode, feedback) is per process",
+            WEBHOOK_WORKERS,
+        )
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+    for index in range(1, WEBHOOK_WORKERS):
+        proc = ctx.Process(
+            target=_webhook_worker, args=(index,), name=f"webhook-{index}", daemon=True
+        )
+        proc.start()
+        workers.append(proc)
+    return workers
+
+
 async def main():
     init_db()
     init_jobs_schema()
@@ -743,11 +932,39 @@ async def main():
     from backend.events import init_events_schema
     init_events_schema()
 
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL missing in environment variables (BOT_MODE=webhook)")
+    # Առանց secret-ի Telegram-ի header-ը չի ստուգվում, և ցանկացածը կարող է POST անել update
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET missing in environment variables (BOT_MODE=webhook)")
+
     from backend.scheduler import start_scheduler
     start_scheduler(bot)
 
-    logger.info("🚀 Starting Madrid Community Bot...")
-    await dp.start_polling(bot, skip_updates=True)
+    # Auto-response таймеры, որոնք սպասում էին restart-ից առաջ
+    # (միայն main process-ում, որ webhook worker-ները չկրկնեն)
+    await bot_responder.restore()
+
+    # Log է անում, եթե որևէ callback բլոկավորում է event loop-ը
+    lag_monitor = start_loop_monitor()
+
+    logger.info("🚀 Starting Madrid Community Bot (%s mode)...", BOT_MODE)
+    workers = []
+    try:
+        if BOT_MODE == "webhook":
+            workers = _spawn_webhook_workers()
+            await _serve_webhook(worker_index=0)
+        else:
+            # Նախկին webhook-ը խանգարում է getUpdates-ին
+            await bot.delete_webhook()
+            await dp.start_polling(bot, skip_updates=True)
+    finally:
+        lag_monitor.cancel()
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.join(timeout=10)
+        await _close_resources()
 
 
 if __name__ == "__main__":
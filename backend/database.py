@@ -1,6 +1,11 @@
 import sqlite3
 import json
 import os
+import threading
+import time
+import atexit
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 
@@ -8,13 +13,365 @@ logger = logging.getLogger(__name__)
 
 DB_PATH = "data/bot.db"
 
-def init_db():
-    """Initialize database with all tables"""
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # Users table
-    cursor.execute("""
+# Pragmas applied to every connection. WAL lets the bot and the web dashboard
+# read and write concurrently; NORMAL sync is safe with WAL.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),        # ~16 MB page cache
+    ("mmap_size", 134217728),      # 128 MB memory-mapped I/O
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),
+)
+
+_local = threading.local()
+_connections = set()
+_connections_lock = threading.Lock()
+
+def _connect():
+    """Open a new SQLite connection with the standard pragmas"""
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False)
+    for name, value in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+class _ConnectionHolder:
+    """
+    Thread-local owner of a connection. When the thread exits its locals are
+    dropped, the holder is collected and the finalizer closes the connection.
+    """
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+def _release(conn):
+    with _connections_lock:
+        _connections.discard(conn)
+    try:
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error closing connection: {e}")
+
+def _thread_connection():
+    """Return the long-lived connection owned by the current thread"""
+    holder = getattr(_local, "holder", None)
+    if holder is None or holder.conn not in _connections:
+        conn = _connect()
+        holder = _ConnectionHolder(conn)
+        weakref.finalize(holder, _release, conn)
+        _local.holder = holder
+        with _connections_lock:
+            _connections.add(conn)
+    return holder.conn
+
+def _release_thread_connection():
+    """Close the current thread's connection right away"""
+    holder = getattr(_local, "holder", None)
+    if holder is not None:
+        del _local.holder
+        _release(holder.conn)
+
+@contextmanager
+def db_connection():
+    """
+    Borrow the current thread's persistent connection.
+    Commits on success, rolls back on error; the connection stays open.
+    """
+    conn = _thread_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def close_connections():
+    """Close all persistent connections (call on shutdown)"""
+    with _connections_lock:
+        conns = list(_connections)
+        _connections.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error closing connection: {e}")
+
+# Marks "not queued" for pending questions (None means a queued delete)
+_NOT_QUEUED = object()
+
+# Write-behind buffer: conversation rows and preference updates are flushed
+# in one transaction once WRITE_BATCH_SIZE rows are queued or
+# WRITE_FLUSH_MS milliseconds have passed.
+WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+WRITE_FLUSH_MS = int(os.getenv("DB_WRITE_FLUSH_MS", "500"))
+# A failed flush keeps its rows and retries with exponential backoff
+WRITE_RETRY_MAX_S = 30
+WRITE_STOP_ATTEMPTS = 3
+
+class _WriteBehindBuffer:
+    """Background writer that batches INSERT/UPDATE statements"""
+
+    def __init__(self, batch_size, flush_ms):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._conversations = []   # [(telegram_id, message, keywords_json)]
+        self._preferences = {}     # {telegram_id: preferences}; last write wins
+        self._in_flight = {}       # preferences being written by flush()
+        self._interests = {}       # {(telegram_id, category, term): [count, last_seen]}
+        self._questions = {}       # {question_id: (user_id, message, search_type, deadline) or None}; last op wins
+        self._in_flight_questions = {}
+        self._flush_lock = threading.Lock()
+        self._failures = 0         # consecutive failed flushes
+        self._retry_at = 0.0       # monotonic time of the next retry
+        self._thread = None
+        self._stopped = False
+
+    def _pending_count(self):
+        return (
+            len(self._conversations) + len(self._preferences)
+            + len(self._interests) + len(self._questions)
+        )
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(
+                target=self._run, name="sqlite-write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def add_conversation(self, telegram_id, message, keywords):
+        with self._lock:
+            self._conversations.append(
+                (telegram_id, message, json.dumps(keywords) if keywords else None)
+            )
+            full = self._pending_count() >= self.batch_size
+            self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def set_preferences(self, telegram_id, preferences):
+        with self._lock:
+            self._preferences[telegram_id] = preferences
+            full = self._pending_count() >= self.batch_size
+            self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def add_interest_counts(self, telegram_id, counts):
+        """counts: iterable of ((category, term), increment)"""
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            for (category, term), increment in counts:
+                entry = self._interests.setdefault((telegram_id, category, term), [0, now])
+                entry[0] += increment
+                entry[1] = now
+            full = self._pending_count() >= self.batch_size
+            self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def set_pending_question(self, question_id, row):
+        """row: (user_id, message, search_type, deadline), or None to delete"""
+        with self._lock:
+            self._questions[question_id] = row
+            full = self._pending_count() >= self.batch_size
+            self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def pending_question(self, question_id):
+        """Queued pending-question row, None if a delete is queued, else _NOT_QUEUED"""
+        with self._lock:
+            if question_id in self._questions:
+                return self._questions[question_id]
+            return self._in_flight_questions.get(question_id, _NOT_QUEUED)
+
+    def pending_preferences(self, telegram_id):
+        """Preferences queued but not yet written (a copy), or None"""
+        with self._lock:
+            prefs = self._preferences.get(telegram_id)
+            if prefs is None:
+                prefs = self._in_flight.get(telegram_id)
+            if prefs is None:
+                return None
+            # Callers modify the result; the queued dict may be serialised by a flush
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in prefs.items()}
+
+    def flush(self):
+        """Write everything queued so far in a single transaction"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            conversations, self._conversations = self._conversations, []
+            # Queued prefs stay visible to readers until the commit is done
+            preferences, self._preferences = self._preferences, {}
+            interests, self._interests = self._interests, {}
+            questions, self._questions = self._questions, {}
+            self._in_flight = preferences
+            self._in_flight_questions = questions
+        if not conversations and not preferences and not interests and not questions:
+            return 0
+        try:
+            with db_connection() as conn:
+                if conversations:
+                    conn.executemany("""
+                        INSERT INTO conversations (telegram_id, message, keywords)
+                        VALUES (?, ?, ?)
+                    """, conversations)
+                if preferences:
+                    conn.executemany("""
+                        UPDATE users
+                        SET preferences = ?
+                        WHERE telegram_id = ?
+                    """, [
+                        (json.dumps(prefs), telegram_id)
+                        for telegram_id, prefs in preferences.items()
+                    ])
+                if interests:
+                    conn.executemany("""
+                        INSERT INTO user_interest_counts
+                            (telegram_id, category, term, count, last_seen)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(telegram_id, category, term) DO UPDATE SET
+                            count = count + excluded.count,
+                            last_seen = excluded.last_seen
+                    """, [
+                        (telegram_id, category, term, count, last_seen)
+                        for (telegram_id, category, term), (count, last_seen)
+                        in interests.items()
+                    ])
+                if questions:
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO pending_questions
+                            (question_id, user_id, message, search_type, deadline)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, [
+                        (question_id, *row)
+                        for question_id, row in questions.items() if row is not None
+                    ])
+                    conn.executemany(
+                        "DELETE FROM pending_questions WHERE question_id = ?",
+                        [
+                            (question_id,)
+                            for question_id, row in questions.items() if row is None
+                        ],
+                    )
+            logger.info(
+                f"Flushed {len(conversations)} conversations, "
+                f"{len(preferences)} preference updates, "
+                f"{len(interests)} interest counters, "
+                f"{len(questions)} pending question changes"
+            )
+            self._failures = 0
+            self._retry_at = 0.0
+        except Exception as e:
+            # Keep the batch: put it back ahead of anything queued meanwhile
+            # and retry with exponential backoff
+            self._requeue(conversations, preferences, interests, questions)
+            self._failures += 1
+            delay = min(self.flush_interval * 2 ** self._failures, WRITE_RETRY_MAX_S)
+            self._retry_at = time.monotonic() + delay
+            logger.error(
+                f"Error flushing write-behind buffer (attempt {self._failures}, "
+                f"retrying in {delay:.1f}s): {e}"
+            )
+            return 0
+        finally:
+            with self._lock:
+                self._in_flight = {}
+                self._in_flight_questions = {}
+        return len(conversations) + len(preferences) + len(interests) + len(questions)
+
+    def _requeue(self, conversations, preferences, interests, questions):
+        """Return a failed batch to the buffer; newer queued operations win"""
+        with self._lock:
+            self._conversations = conversations + self._conversations
+            for telegram_id, prefs in preferences.items():
+                self._preferences.setdefault(telegram_id, prefs)
+            for key, (count, last_seen) in interests.items():
+                entry = self._interests.get(key)
+                if entry is None:
+                    self._interests[key] = [count, last_seen]
+                else:
+                    entry[0] += count
+            for question_id, row in questions.items():
+                self._questions.setdefault(question_id, row)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if time.monotonic() < self._retry_at:
+                continue  # backing off after a failed flush
+            self.flush()
+        # Background thread owns its own connection; release it on exit
+        _release_thread_connection()
+
+    def stop(self):
+        """Stop the background thread and write what is left"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=10)
+        for attempt in range(WRITE_STOP_ATTEMPTS):
+            self.flush()
+            if not self._failures:
+                return
+            time.sleep(min(2 ** attempt, 5))
+        logger.error(
+            f"Write-behind buffer could not be flushed on stop; "
+            f"{self._pending_count()} queued writes lost"
+        )
+
+_write_buffer = _WriteBehindBuffer(WRITE_BATCH_SIZE, WRITE_FLUSH_MS)
+atexit.register(_write_buffer.stop)
+
+def queue_conversation(telegram_id, message, keywords=None):
+    """Queue a conversation row for the background writer"""
+    _write_buffer.add_conversation(telegram_id, message, keywords)
+
+def queue_user_preferences(telegram_id, preferences):
+    """Queue a preferences update for the background writer"""
+    _write_buffer.set_preferences(telegram_id, preferences)
+
+def queue_interest_counts(telegram_id, counts):
+    """
+    Queue incremental interest counter updates.
+    counts: iterable of ((category, term), increment)
+    """
+    _write_buffer.add_interest_counts(telegram_id, counts)
+
+def queue_pending_question(question_id, user_id, message, search_type, deadline):
+    """Queue a pending auto-response (deadline: unix time)"""
+    _write_buffer.set_pending_question(
+        question_id, (user_id, message, search_type, deadline)
+    )
+
+def queue_pending_question_done(question_id):
+    """Queue removal of a pending auto-response (answered, fired or dropped)"""
+    _write_buffer.set_pending_question(question_id, None)
+
+def flush_writes():
+    """Synchronously write everything queued in the write-behind buffer"""
+    return _write_buffer.flush()
+
+def stop_write_behind():
+    """Flush the write-behind buffer and stop its thread (call on shutdown)"""
+    _write_buffer.stop()
+
+# Schema migrations: (version, description, statements).
+# Applied versions are recorded in PRAGMA user_version, so init_db only
+# reads one header field when the schema is already current.
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             telegram_id INTEGER UNIQUE NOT NULL,
@@ -23,9 +380,8 @@ def init_db():
             preferences TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    # Conversations table
-    cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS conversations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             telegram_id INTEGER NOT NULL,
@@ -33,9 +389,8 @@ def init_db():
             keywords TEXT,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    # Job offers
-    cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS job_offers (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             telegram_id INTEGER NOT NULL,
@@ -46,9 +401,8 @@ def init_db():
             salary TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    # Job requests
-    cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS job_requests (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             telegram_id INTEGER NOT NULL,
@@ -59,67 +413,198 @@ def init_db():
             expected_salary TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    conn.commit()
-    conn.close()
+        """,
+    ]),
+    (2, "conversation indexes", [
+        # get_user_conversations: WHERE telegram_id = ? ORDER BY timestamp DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_ts
+            ON conversations (telegram_id, timestamp)
+        """,
+        # /api/stats recent messages: ORDER BY timestamp DESC LIMIT 10
+        """
+        CREATE INDEX IF NOT EXISTS idx_conversations_ts
+            ON conversations (timestamp)
+        """,
+    ]),
+    (3, "per-user interest counters", [
+        # One row per (user, category, term); category 'messages' with an
+        # empty term counts all analysed messages of the user.
+        """
+        CREATE TABLE IF NOT EXISTS user_interest_counts (
+            telegram_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            term TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (telegram_id, category, term)
+        ) WITHOUT ROWID
+        """,
+        # Backfill from existing history
+        """
+        INSERT INTO user_interest_counts (telegram_id, category, term, count, last_seen)
+        SELECT c.telegram_id, k.key, w.value, COUNT(*), MAX(c.timestamp)
+        FROM conversations c, json_each(c.keywords) k, json_each(k.value) w
+        WHERE c.keywords IS NOT NULL AND json_valid(c.keywords)
+          AND json_type(c.keywords) = 'object' AND k.type = 'array'
+        GROUP BY c.telegram_id, k.key, w.value
+        """,
+        """
+        INSERT INTO user_interest_counts (telegram_id, category, term, count, last_seen)
+        SELECT telegram_id, 'messages', '', COUNT(*), MAX(timestamp)
+        FROM conversations
+        GROUP BY telegram_id
+        """,
+    ]),
+    (4, "housing listings", [
+        """
+        CREATE TABLE IF NOT EXISTS housing_listings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            role TEXT NOT NULL,            -- 'offer' or 'request'
+            type TEXT,                     -- apartment / house / room
+            price INTEGER,                 -- euros (rent, or budget for requests)
+            rooms INTEGER,
+            location TEXT,
+            message TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_housing_role_loc_type_price
+            ON housing_listings (role, location, type, price)
+        """,
+    ]),
+    (5, "AI answer cache", [
+        """
+        CREATE TABLE IF NOT EXISTS ai_answer_cache (
+            key TEXT PRIMARY KEY,          -- normalized question
+            question TEXT NOT NULL,        -- first original wording
+            answer TEXT NOT NULL,
+            latency_ms REAL NOT NULL DEFAULT 0,  -- upstream time of the original call
+            created_at REAL NOT NULL,      -- unix time
+            last_hit REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_ai_answer_cache_last_hit
+            ON ai_answer_cache (last_hit)
+        """,
+    ]),
+    (6, "pending auto-response questions", [
+        """
+        CREATE TABLE IF NOT EXISTS pending_questions (
+            question_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            search_type TEXT NOT NULL,
+            deadline REAL NOT NULL         -- unix time when the auto-response fires
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_pending_questions_deadline
+            ON pending_questions (deadline)
+        """,
+    ]),
+    (7, "AI answer cache counters", [
+        """
+        CREATE TABLE IF NOT EXISTS ai_answer_cache_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 0),  -- single row
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,      -- answers fetched upstream and stored
+            time_saved_ms REAL NOT NULL DEFAULT 0
+        )
+        """,
+        # Backfill from the entries still cached; each of them was one miss
+        """
+        INSERT INTO ai_answer_cache_stats (id, hits, misses, time_saved_ms)
+        SELECT 0, COALESCE(SUM(hits), 0), COUNT(*), COALESCE(SUM(hits * latency_ms), 0)
+        FROM ai_answer_cache
+        """,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def _schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def init_db():
+    """Initialize database and apply pending schema migrations"""
+    os.makedirs("data", exist_ok=True)
+    conn = _connect()
+    conn.isolation_level = None  # explicit transactions below
+    try:
+        if _schema_version(conn) >= SCHEMA_VERSION:
+            logger.info(f"Database schema is up to date (v{SCHEMA_VERSION})")
+            return
+        for version, description, statements in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-check inside the write lock: another process may have
+                # migrated while we were waiting
+                if _schema_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logger.info(f"Applied migration v{version}: {description}")
+    finally:
+        conn.close()
     logger.info("Database initialized successfully")
 
 def get_connection():
-    """Get database connection"""
-    return sqlite3.connect(DB_PATH)
+    """Get a new standalone database connection (caller closes it)"""
+    return _connect()
 
 def get_db_connection():
     """Для web панели: создать SQLite соединение"""
-    return sqlite3.connect(DB_PATH)
+    return _connect()
 
 def save_user(telegram_id, username=None, language='ru'):
     """Save or update user"""
-    conn = get_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO users (telegram_id, username, language)
-            VALUES (?, ?, ?)
-            ON CONFLICT(telegram_id) DO UPDATE SET
-                username = excluded.username,
-                language = excluded.language
-        """, (telegram_id, username, language))
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute("""
+                INSERT INTO users (telegram_id, username, language)
+                VALUES (?, ?, ?)
+                ON CONFLICT(telegram_id) DO UPDATE SET
+                    username = excluded.username,
+                    language = excluded.language
+            """, (telegram_id, username, language))
         logger.info(f"User {telegram_id} saved")
     except Exception as e:
         logger.error(f"Error saving user: {e}")
-    finally:
-        conn.close()
 
 def save_conversation(telegram_id, message, keywords=None):
     """Save conversation message"""
-    conn = get_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO conversations (telegram_id, message, keywords)
-            VALUES (?, ?, ?)
-        """, (telegram_id, message, json.dumps(keywords) if keywords else None))
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute("""
+                INSERT INTO conversations (telegram_id, message, keywords)
+                VALUES (?, ?, ?)
+            """, (telegram_id, message, json.dumps(keywords) if keywords else None))
         logger.info(f"Conversation saved for user {telegram_id}")
     except Exception as e:
         logger.error(f"Error saving conversation: {e}")
-    finally:
-        conn.close()
 
 def get_user_conversations(telegram_id, limit=50):
     """Get recent conversations for a user"""
-    conn = get_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT message, keywords, timestamp
-            FROM conversations
-            WHERE telegram_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (telegram_id, limit))
-        conversations = cursor.fetchall()
+        with db_connection() as conn:
+            conversations = conn.execute("""
+                SELECT message, keywords, timestamp
+                FROM conversations
+                WHERE telegram_id = ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """, (telegram_id, limit)).fetchall()
         return [
             {
                 'message': row[0],
@@ -131,42 +616,182 @@ def get_user_conversations(telegram_id, limit=50):
     except Exception as e:
         logger.error(f"Error getting conversations: {e}")
         return []
-    finally:
-        conn.close()
 
 def update_user_preferences(telegram_id, preferences):
     """Update user preferences (JSON)"""
-    conn = get_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            UPDATE users
-            SET preferences = ?
-            WHERE telegram_id = ?
-        """, (json.dumps(preferences), telegram_id))
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute("""
+                UPDATE users
+                SET preferences = ?
+                WHERE telegram_id = ?
+            """, (json.dumps(preferences), telegram_id))
         logger.info(f"Preferences updated for user {telegram_id}")
     except Exception as e:
         logger.error(f"Error updating preferences: {e}")
-    finally:
-        conn.close()
 
 def get_user_preferences(telegram_id):
     """Get user preferences"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    pending = _write_buffer.pending_preferences(telegram_id)
+    if pending is not None:
+        return pending
     try:
-        cursor.execute("""
-            SELECT preferences
-            FROM users
-            WHERE telegram_id = ?
-        """, (telegram_id,))
-        result = cursor.fetchone()
+        with db_connection() as conn:
+            result = conn.execute("""
+                SELECT preferences
+                FROM users
+                WHERE telegram_id = ?
+            """, (telegram_id,)).fetchone()
         if result and result[0]:
             return json.loads(result[0])
         return {}
     except Exception as e:
         logger.error(f"Error getting preferences: {e}")
         return {}
-    finally:
-        conn.close()
+
+def get_user_interest_counts(telegram_id):
+    """
+    Get interest counters for a user as {category: [(term, count), ...]},
+    most frequent first
+    """
+    try:
+        with db_connection() as conn:
+            rows = conn.execute("""
+                SELECT category, term, count
+                FROM user_interest_counts
+                WHERE telegram_id = ?
+                ORDER BY count DESC, last_seen DESC
+            """, (telegram_id,)).fetchall()
+        counts = {}
+        for category, term, count in rows:
+            counts.setdefault(category, []).append((term, count))
+        return counts
+    except Exception as e:
+        logger.error(f"Error getting interest counts: {e}")
+        return {}
+
+def get_cached_answer(key, max_age):
+    """
+    Return (answer, latency_ms) for a normalized question if it is younger
+    than max_age seconds, and record the hit for LRU eviction
+    """
+    now = time.time()
+    try:
+        with db_connection() as conn:
+            row = conn.execute("""
+                SELECT answer, latency_ms
+                FROM ai_answer_cache
+                WHERE key = ? AND created_at >= ?
+            """, (key, now - max_age)).fetchone()
+            if row is None:
+                return None
+            conn.execute("""
+                UPDATE ai_answer_cache
+                SET last_hit = ?, hits = hits + 1
+                WHERE key = ?
+            """, (now, key))
+            conn.execute("""
+                UPDATE ai_answer_cache_stats
+                SET hits = hits + 1, time_saved_ms = time_saved_ms + ?
+                WHERE id = 0
+            """, (row[1],))
+        return row[0], row[1]
+    except Exception as e:
+        logger.error(f"Error reading AI answer cache: {e}")
+        return None
+
+def store_cached_answer(key, question, answer, latency_ms, max_age, max_entries):
+    """
+    Store an answer, drop expired entries and evict the least recently used
+    ones beyond max_entries
+    """
+    now = time.time()
+    try:
+        with db_connection() as conn:
+            conn.execute("""
+                INSERT INTO ai_answer_cache
+                    (key, question, answer, latency_ms, created_at, last_hit, hits)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(key) DO UPDATE SET
+                    answer = excluded.answer,
+                    latency_ms = excluded.latency_ms,
+                    created_at = excluded.created_at,
+                    last_hit = excluded.last_hit
+            """, (key, question, answer, latency_ms, now, now))
+            conn.execute(
+                "UPDATE ai_answer_cache_stats SET misses = misses + 1 WHERE id = 0"
+            )
+            conn.execute(
+                "DELETE FROM ai_answer_cache WHERE created_at < ?",
+                (now - max_age,),
+            )
+            conn.execute("""
+                DELETE FROM ai_answer_cache
+                WHERE key IN (
+                    SELECT key FROM ai_answer_cache
+                    ORDER BY last_hit DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (max_entries,))
+    except Exception as e:
+        logger.error(f"Error writing AI answer cache: {e}")
+
+def get_ai_answer_cache_stats():
+    """
+    AI answer cache totals across all bot processes: entries, hits, misses,
+    hit rate and upstream time saved
+    """
+    try:
+        with db_connection() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM ai_answer_cache").fetchone()[0]
+            hits, misses, saved_ms = conn.execute("""
+                SELECT hits, misses, time_saved_ms
+                FROM ai_answer_cache_stats
+                WHERE id = 0
+            """).fetchone() or (0, 0, 0)
+        total = hits + misses
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'time_saved_s': round(saved_ms / 1000, 1),
+        }
+    except Exception as e:
+        logger.error(f"Error getting AI answer cache stats: {e}")
+        return {}
+
+def load_pending_questions(now=None):
+    """
+    Drop expired pending questions and return the rest as
+    [(question_id, user_id, search_type, deadline)], earliest first.
+    Message text stays in the table; see get_pending_question_message.
+    """
+    now = time.time() if now is None else now
+    try:
+        with db_connection() as conn:
+            conn.execute("DELETE FROM pending_questions WHERE deadline < ?", (now,))
+            return conn.execute("""
+                SELECT question_id, user_id, search_type, deadline
+                FROM pending_questions
+                ORDER BY deadline
+            """).fetchall()
+    except Exception as e:
+        logger.error(f"Error loading pending questions: {e}")
+        return []
+
+def get_pending_question_message(question_id):
+    """Message text of a pending question, or None if it is gone"""
+    queued = _write_buffer.pending_question(question_id)
+    if queued is not _NOT_QUEUED:
+        return queued[1] if queued is not None else None
+    try:
+        with db_connection() as conn:
+            row = conn.execute(
+                "SELECT message FROM pending_questions WHERE question_id = ?",
+                (question_id,),
+            ).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Error reading pending question: {e}")
+        return None
@@ -1,13 +1,21 @@
 # backend/events_sources_madrid.py
 
+import os
+import json
+import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import List, Dict, Optional
+from urllib.parse import urlsplit
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
 
 from backend.events import _get_conn as get_connection
+from backend.events import invalidate_events_cache
 
 logger = logging.getLogger(__name__)
 
@@ -42,11 +50,175 @@ RESTAURANT_EVENT_URLS: list[str] = []
 #  LOW-LEVEL HELPERS
 # ==========================
 
-def _http_get(url: str) -> Optional[BeautifulSoup]:
+# Զուգահեռ scraping-ի սահմանափակումներ
+SCRAPE_MAX_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", "8"))
+SCRAPE_PER_HOST_LIMIT = int(os.getenv("SCRAPE_PER_HOST_LIMIT", "4"))
+HTTP_TIMEOUT = 10
+
+# Soft-deleted event-ները ամբողջությամբ ջնջվում են այսքան օր հետո
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "30"))
+
+# On-disk HTTP cache (body + ETag/Last-Modified) conditional GET-երի համար
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/http_cache")
+
+# _http_get-ը սա է վերադարձնում, երբ էջը չի փոխվել (304) և skip_unchanged=True
+NOT_MODIFIED = object()
+
+# HTML parser backend՝ "html.parser" (default) կամ "lxml" (եթե տեղադրված է)
+HTML_PARSER = os.getenv("HTML_PARSER", "html.parser")
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def _get_session() -> requests.Session:
+    """
+    Ընդհանուր requests.Session (keep-alive) բոլոր էջերի համար.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=SCRAPE_PER_HOST_LIMIT,
+                pool_maxsize=SCRAPE_PER_HOST_LIMIT,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    """
+    Մեկ host-ի վրա միաժամանակ ոչ ավելի քան SCRAPE_PER_HOST_LIMIT request.
+    """
+    host = urlsplit(url).netloc
+    with _session_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(SCRAPE_PER_HOST_LIMIT)
+        return slot
+
+
+def _has_class(attrs: Dict, cls: str) -> bool:
+    value = attrs.get("class") or ""
+    classes = value.split() if isinstance(value, str) else value
+    return cls in classes
+
+
+# Parse ենք անում միայն այն subtree-երը, որոնք հետո կարդում ենք.
+# Cartelera: ֆիլմերի նկարները + կինոթատրոնների aside-ը
+CINEMA_PAGE_STRAINER = SoupStrainer(
+    lambda name, attrs: (
+        (name == "img" and _has_class(attrs, "movie-list-thumb"))
+        or (name == "aside" and attrs.get("id") == "movie_theater_list")
+    )
+)
+# Espectáculos: միայն mosaic քարտերը
+MOSAIC_PAGE_STRAINER = SoupStrainer(
+    lambda name, attrs: name == "div" and _has_class(attrs, "d-mosaic__box")
+)
+
+
+def _parse_html(
+    html: str, parse_only: Optional[SoupStrainer] = None, parser: Optional[str] = None
+) -> BeautifulSoup:
+    """
+    BeautifulSoup՝ ընտրված backend-ով (HTML_PARSER) և, եթե տրված է,
+    միայն parse_only strainer-ին համապատասխանող հատվածներով.
+    """
+    parser = parser or HTML_PARSER
+    try:
+        return BeautifulSoup(html, parser, parse_only=parse_only)
+    except FeatureNotFound:
+        logger.warning(f"HTML parser '{parser}' is not installed, using html.parser")
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+
+def _cache_paths(url: str) -> tuple:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    base = os.path.join(HTTP_CACHE_DIR, key)
+    return base + ".json", base + ".html"
+
+
+def _load_cached(url: str) -> Optional[Dict[str, str]]:
+    """
+    Վերադարձնում է {"etag", "last_modified", "body"} կամ None, եթե cache չկա.
+    """
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, encoding="utf-8") as f:
+            meta["body"] = f.read()
+        return meta
+    except (OSError, ValueError):
+        return None
+
+
+def _store_cached(url: str, resp: requests.Response) -> None:
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+    meta_path, body_path = _cache_paths(url)
     try:
-        resp = requests.get(url, timeout=10)
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        # body-ն առաջինը, որ meta-ն երբեք չմատնանշի կիսատ body
+        for path, content in (
+            (body_path, resp.text),
+            (meta_path, json.dumps(
+                {"url": url, "etag": etag, "last_modified": last_modified}
+            )),
+        ):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write HTTP cache for {url}: {e}")
+
+
+def forget_http_cache(url: str) -> None:
+    """
+    Ջնջում է URL-ի cache-ը (հաջորդ անգամ էջը կքաշվի ամբողջությամբ).
+    """
+    for path in _cache_paths(url):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _http_get(
+    url: str, skip_unchanged: bool = False, parse_only: Optional[SoupStrainer] = None
+):
+    """
+    GET՝ If-None-Match / If-Modified-Since header-ներով, եթե էջը cache-ում կա.
+    304-ի դեպքում՝ NOT_MODIFIED (skip_unchanged=True) կամ cache-ված body-ն.
+    Error-ի դեպքում՝ None.
+    """
+    cached = _load_cached(url)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        with _host_slot(url):
+            resp = _get_session().get(url, timeout=HTTP_TIMEOUT, headers=headers)
+        if resp.status_code == 304 and cached:
+            if skip_unchanged:
+                logger.info(f"Not modified: {url}")
+                return NOT_MODIFIED
+            return _parse_html(cached["body"], parse_only)
         resp.raise_for_status()
-        return BeautifulSoup(resp.text, "html.parser")
+        _store_cached(url, resp)
+        return _parse_html(resp.text, parse_only)
     except Exception as e:
         logger.error(f"Error fetching URL {url}: {e}", exc_info=True)
         return None
@@ -60,16 +232,28 @@ def _today_str() -> str:
 #  CINEMA – TAQUILLA CARTELERA
 # ==========================
 
-def fetch_madrid_cinema_events(limit: int = 30) -> List[Event]:
+def fetch_madrid_cinema_events(
+    limit: int = 30, skip_unchanged: bool = False
+) -> Optional[List[Event]]:
     """
     Քաշում է Taquilla cartelera Madrid էջից մինչև `limit` ֆիլմեր.
     Ամեն ֆիլմի համար ընտրում է մեկ կոնկրետ կինոթատրոն Մադրիդում,
     և վերադարձնում Event dict list, պատրաստ DB-ի համար:
+    skip_unchanged=True և էջը չի փոխվել (304) → None.
     """
-    soup = _http_get(TAQUILLA_CARTELERA_MADRID_URL)
+    soup = _http_get(
+        TAQUILLA_CARTELERA_MADRID_URL,
+        skip_unchanged=skip_unchanged,
+        parse_only=CINEMA_PAGE_STRAINER,
+    )
+    if soup is NOT_MODIFIED:
+        return None
     if not soup:
         return []
+    return _cinema_events_from_soup(soup, limit)
 
+
+def _cinema_events_from_soup(soup: BeautifulSoup, limit: int) -> List[Event]:
     # 1) ֆիլմերի map՝ slug -> (title, image_url)
     movies: Dict[str, Dict[str, str]] = {}
     for img in soup.select("img.movie-list-thumb"):
@@ -154,7 +338,7 @@ def _parse_taquilla_mosaic_date_range(date_text: str) -> str:
     """
     Mosaic картերում օրը գալիս է որպես:
       'Del <span>01-03-2026</span> al <span>04-01-2026</span>'
-    Վերադարձնում է start date ISO-ով (YYYY-MM-DD) կամ այսօր:
+    Վերադարձնում է start date ISO-ով (YYYY-MM-DD) կամ "", եթե parse չեղավ:
     """
     try:
         parts = date_text.split()
@@ -165,10 +349,12 @@ def _parse_taquilla_mosaic_date_range(date_text: str) -> str:
                 return dt.date().isoformat()
     except Exception:
         pass
-    return _today_str()
+    return ""
 
 
-def fetch_taquilla_show_category(url: str, category_slug: str, limit: int = 20) -> List[Event]:
+def fetch_taquilla_show_category(
+    url: str, category_slug: str, limit: int = 20, skip_unchanged: bool = False
+) -> Optional[List[Event]]:
     """
     Քաշում է մինչև `limit` շոու Taquilla-ի որևէ «espectaculos/.../madrid» էջից
     (Musicales, Teatro, Ninos, Circo, Flamenco և այլն):
@@ -178,11 +364,17 @@ def fetch_taquilla_show_category(url: str, category_slug: str, limit: int = 20)
       - price (Desde X,00€)
       - image_url
       - source_url
+    skip_unchanged=True և էջը չի փոխվել (304) → None.
     """
-    soup = _http_get(url)
+    soup = _http_get(url, skip_unchanged=skip_unchanged, parse_only=MOSAIC_PAGE_STRAINER)
+    if soup is NOT_MODIFIED:
+        return None
     if not soup:
         return []
+    return _show_events_from_soup(soup, category_slug, limit)
+
 
+def _show_events_from_soup(soup: BeautifulSoup, category_slug: str, limit: int) -> List[Event]:
     events: List[Event] = []
 
     for box in soup.select("div.d-mosaic__box"):
@@ -214,7 +406,7 @@ def fetch_taquilla_show_category(url: str, category_slug: str, limit: int = 20)
 
         # Ամսաթիվ range
         date_div = box.select_one(".d-mosaic__date")
-        date_iso = _today_str()
+        date_iso = ""
         if date_div:
             date_iso = _parse_taquilla_mosaic_date_range(
                 date_div.get_text(" ", strip=True)
@@ -231,13 +423,16 @@ def fetch_taquilla_show_category(url: str, category_slug: str, limit: int = 20)
             "title": title,
             "place": place or "Madrid",
             "time": "",  # Mosaic-ում час չկա, հետո եթե գտնենք՝ կավելացնենք
-            "date": date_iso,
+            "date": date_iso or _today_str(),
             "category": category_slug,
             "source_url": source_url,
             "address": "",
             "price": price_text,
             "image_url": image_url,
         }
+        if not date_iso:
+            # Ամսաթիվ չկա → date-ը «այսօր» է, sync-ը identity-ում այն չի հաշվում
+            ev["undated"] = "1"
         events.append(ev)
 
     return events
@@ -247,46 +442,194 @@ def fetch_taquilla_show_category(url: str, category_slug: str, limit: int = 20)
 #  DB WRITE HELPERS
 # ==========================
 
-def _save_event_to_db(ev: Event) -> None:
+_EVENT_COLUMNS = (
+    "title", "place", "start_time", "date", "category",
+    "source_url", "address", "price", "image_url",
+)
+
+
+def _event_row(ev: Event) -> tuple:
     """
-    Գրանցում է event-ը madrid_events աղյուսակում.
-    date-ը պահում է ev["date"]-ով, եթե կա, ellers՝ այսօր:
+    Event dict -> row madrid_events-ի սյունակների հերթականությամբ.
+    start_time-ը TIMESTAMPTZ է, դատարկ string-ը պետք է դառնա NULL.
     """
+    return (
+        ev.get("title", ""),
+        ev.get("place", ""),
+        ev.get("time") or None,
+        ev.get("date") or _today_str(),
+        ev.get("category", ""),
+        ev.get("source_url", ""),
+        ev.get("address", ""),
+        ev.get("price", ""),
+        ev.get("image_url", ""),
+    )
+
+
+# Կատեգորիաներ, որտեղ էջը ամսաթիվ չունի և date-ը պարզապես «այսօր» է
+# (cartelera-ն ցույց է տալիս հիմա ցուցադրվողը). Նույնն է ev["undated"]
+# նշված event-ների համար (mosaic քարտ առանց ամսաթվի). Նրանց identity-ն
+# (category, title, place) է, իսկ date-ը թարմացվում է տեղում՝ ամեն գիշեր
+# նոր row INSERT + երեկվանի soft-DELETE անելու փոխարեն.
+_UNDATED_CATEGORIES = frozenset({"cinema"})
+
+
+def _content_hash(row: tuple) -> str:
+    return hashlib.sha1(
+        "\x1f".join("" if v is None else str(v) for v in row).encode("utf-8")
+    ).hexdigest()
+
+
+def sync_category_events(category: str, events: List[Event]) -> Dict[str, int]:
+    """
+    Diff-ով համաժամեցնում է մեկ կատեգորիայի scrape-ը madrid_events-ի հետ.
+    Ամեն event-ի content_hash-ը համեմատվում է պահվածի հետ և մեկ transaction-ով
+    արվում են միայն անհրաժեշտ գործողությունները.
+      - նոր identity (category, title, place, date) → INSERT
+      - hash-ը փոխվել է կամ row-ը soft-deleted է → UPDATE
+      - DB-ում կա, scrape-ում չկա → soft-DELETE (deleted_at = now())
+    Undated event-ների (_UNDATED_CATEGORIES կամ ev["undated"]) identity-ն ու
+    hash-ը date չեն պարունակում. նրանք համընկնում են նույն (title, place)-ով
+    row-ի հետ, իսկ չփոխված row-երի date-ը տեղափոխվում է այսօր (հաշվվում են
+    որպես unchanged).
+    Վերադարձնում է {"inserted", "updated", "deleted", "unchanged", "skipped", "failed"}.
+    """
+    stats = {
+        "inserted": 0, "updated": 0, "deleted": 0,
+        "unchanged": 0, "skipped": 0, "failed": 0,
+    }
+    category_undated = category in _UNDATED_CATEGORIES
+
+    # (title, place, date) -> (row, undated)
+    scraped: Dict[tuple, tuple] = {}
+    for ev in events:
+        if not ev.get("title"):
+            stats["skipped"] += 1
+            continue
+        row = _event_row({**ev, "category": category})
+        key = (row[0], row[1], row[3])
+        if key in scraped:
+            stats["skipped"] += 1
+            continue
+        scraped[key] = (row, category_undated or bool(ev.get("undated")))
+
+    if not scraped:
+        # Դատարկ արդյունքը (fetch error / փոխված markup) չպետք է ջնջի ամբողջ կատեգորիան
+        logger.warning("No events scraped for category %s, keeping existing rows", category)
+        return stats
+
+    columns = ", ".join(_EVENT_COLUMNS)
+    placeholders = ", ".join(["%s"] * len(_EVENT_COLUMNS))
+
     try:
-        from backend.events import _get_conn
-
-        conn = _get_conn()
-        cur = conn.cursor()
-
-        date_str = ev.get("date") or _today_str()
-
-        cur.execute(
-            """
-            INSERT INTO madrid_events 
-                (title, place, start_time, date, category,
-                 source_url, address, price, image_url)
-            VALUES 
-                (%s, %s, %s, %s, %s,
-                 %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
-            """,
-            (
-                ev.get("title", ""),
-                ev.get("place", ""),
-                ev.get("time", ""),
-                date_str,
-                ev.get("category", ""),
-                ev.get("source_url", ""),
-                ev.get("address", ""),
-                ev.get("price", ""),
-                ev.get("image_url", ""),
-            ),
-        )
-        conn.commit()
-        conn.close()
-        logger.debug(f"Saved event: {ev.get('title')}")
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, title, place, date, content_hash, deleted_at IS NOT NULL
+                FROM madrid_events
+                WHERE category = %s
+                ORDER BY date DESC, id DESC
+                FOR UPDATE;
+                """,
+                (category,),
+            )
+            # row_id -> (content_hash, is_deleted, date)
+            existing: Dict[int, tuple] = {}
+            by_key: Dict[tuple, int] = {}
+            # (title, place) -> row_id-ներ, նորագույն date-ը առաջինը
+            by_pair: Dict[tuple, List[int]] = {}
+            for row_id, title, place, date, content_hash, is_deleted in cur.fetchall():
+                existing[row_id] = (content_hash, is_deleted, str(date))
+                by_key[(title, place, str(date))] = row_id
+                by_pair.setdefault((title, place), []).append(row_id)
+
+            # Նախ dated event-ները (ճշգրիտ key-ով), հետո undated-ը՝ նույն
+            # (title, place)-ի դեռ չզբաղված row-ով. այսօրվա date-ով row-ը
+            # նախընտրելի է, որ UPDATE-ը չխախտի unique (category, title, place, date)-ը
+            matches: List[tuple] = []
+            claimed: set = set()
+            for key, (row, undated) in sorted(scraped.items(), key=lambda item: item[1][1]):
+                row_id = by_key.get(key)
+                if undated and (row_id is None or row_id in claimed):
+                    row_id = next(
+                        (rid for rid in by_pair.get(key[:2], ()) if rid not in claimed),
+                        None,
+                    )
+                if row_id is not None:
+                    claimed.add(row_id)
+                matches.append((row, undated, row_id))
+
+            to_insert: List[tuple] = []
+            to_update: List[tuple] = []
+            to_redate: List[tuple] = []
+            for row, undated, row_id in matches:
+                new_hash = _content_hash(row[:3] + row[4:] if undated else row)
+                if row_id is None:
+                    to_insert.append(row + (new_hash,))
+                    continue
+                content_hash, is_deleted, date = existing[row_id]
+                if content_hash != new_hash or is_deleted:
+                    to_update.append(row[2:4] + row[5:] + (new_hash, row_id))
+                else:
+                    stats["unchanged"] += 1
+                    if date != row[3]:
+                        to_redate.append((row[3], row_id))
+
+            # Չհամընկած row-երը (ներառյալ նախկին օրերի կրկնօրինակները) ջնջվում են
+            to_delete = [
+                row_id
+                for row_id, (_, is_deleted, _) in existing.items()
+                if row_id not in claimed and not is_deleted
+            ]
+
+            if to_insert:
+                cur.executemany(
+                    f"""
+                    INSERT INTO madrid_events ({columns}, content_hash)
+                    VALUES ({placeholders}, %s);
+                    """,
+                    to_insert,
+                )
+            if to_update:
+                cur.executemany(
+                    """
+                    UPDATE madrid_events
+                    SET start_time   = %s,
+                        date         = %s,
+                        source_url   = %s,
+                        address      = %s,
+                        price        = %s,
+                        image_url    = %s,
+                        content_hash = %s,
+                        deleted_at   = NULL,
+                        updated_at   = now()
+                    WHERE id = %s;
+                    """,
+                    to_update,
+                )
+            if to_redate:
+                cur.executemany(
+                    "UPDATE madrid_events SET date = %s WHERE id = %s;",
+                    to_redate,
+                )
+            if to_delete:
+                cur.execute(
+                    """
+                    UPDATE madrid_events
+                    SET deleted_at = now(), updated_at = now()
+                    WHERE id = ANY(%s);
+                    """,
+                    (to_delete,),
+                )
     except Exception as e:
-        logger.error(f"Error saving event to DB: {e}", exc_info=True)
+        logger.error(f"Error syncing events for category {category}: {e}", exc_info=True)
+        stats["failed"] = len(scraped)
+        return stats
+
+    stats["inserted"] = len(to_insert)
+    stats["updated"] = len(to_update)
+    stats["deleted"] = len(to_delete)
+    return stats
 
 
 # ==========================
@@ -296,32 +639,240 @@ def _save_event_to_db(ev: Event) -> None:
 def refresh_madrid_events_for_today() -> None:
     """
     Ամեն գիշեր.
-    - Ջնջում է մինչև այսօրը ներառյալ նախորդ օրերի events-ները.
-    - Քաշում է այսօրվա / ընթացիկ շոுனերը տարբեր կատեգորիաներից.
+    - Քաշում է այսօրվա / ընթացիկ շոուները տարբեր կատեգորիաներից
+      և diff-ով համաժամեցնում (INSERT / UPDATE / soft-DELETE միայն փոփոխվածը).
+    - Ջնջում է EVENTS_RETENTION_DAYS-ից վաղ soft-deleted արված row-երը.
     """
-    today = _today_str()
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM madrid_events WHERE date < %s;", (today,))
-        conn.commit()
-        conn.close()
-        logger.info("Cleared past madrid_events before refresh")
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM madrid_events
+                WHERE deleted_at < now() - make_interval(days => %s);
+                """,
+                (EVENTS_RETENTION_DAYS,),
+            )
+            purged = cur.rowcount
+        logger.info("Purged %d expired madrid_events rows", purged)
     except Exception as e:
-        logger.error(f"Error clearing past events: {e}", exc_info=True)
+        logger.error(f"Error purging expired events: {e}", exc_info=True)
+
+    # Բոլոր էջերը քաշում ենք զուգահեռ, և յուրաքանչյուրը գրում ենք DB
+    # հենց որ պատրաստ է (մեկ transaction մեկ էջի համար).
+    # Չփոխված էջերը (HTTP 304) բաց ենք թողնում՝ առանց parse/DB write.
+    totals = {
+        "inserted": 0, "updated": 0, "deleted": 0,
+        "unchanged": 0, "skipped": 0, "failed": 0,
+    }
+    unchanged: List[str] = []
+    with ThreadPoolExecutor(max_workers=SCRAPE_MAX_WORKERS) as executor:
+        # 🎬 Կինո – Taquilla cartelera (մինչև 30 ֆիլմ)
+        future = executor.submit(fetch_madrid_cinema_events, 30, skip_unchanged=True)
+        futures = {future: ("cinema", TAQUILLA_CARTELERA_MADRID_URL)}
+
+        # 🎭 Շոու / թատրոն / մյուզիքլ / kids / և այլն — յուրաքանչյուրից մինչև 20 event
+        for category_slug, url in TAQUILLA_SHOW_CATEGORIES.items():
+            future = executor.submit(
+                fetch_taquilla_show_category, url, category_slug, 20, skip_unchanged=True
+            )
+            futures[future] = (category_slug, url)
+
+        for future in as_completed(futures):
+            category_slug, url = futures[future]
+            try:
+                events = future.result()
+            except Exception as e:
+                logger.error(f"Error scraping category {category_slug}: {e}", exc_info=True)
+                continue
 
-    # 🎬 Կինո – Taquilla cartelera (մինչև 30 ֆիլմ)
-    for ev in fetch_madrid_cinema_events(limit=30):
-        _save_event_to_db(ev)
+            if events is None:
+                unchanged.append(category_slug)
+                continue
+
+            stats = sync_category_events(category_slug, events)
+            if stats["failed"]:
+                # DB-ում չգրվեց → հաջորդ անգամ էջը պետք է նորից մշակել
+                forget_http_cache(url)
+            for key in totals:
+                totals[key] += stats[key]
+            logger.info(
+                "Category %s diff: %d scraped, +%d inserted, ~%d updated, "
+                "-%d deleted, %d unchanged, %d skipped",
+                category_slug,
+                len(events),
+                stats["inserted"],
+                stats["updated"],
+                stats["deleted"],
+                stats["unchanged"],
+                stats["skipped"],
+            )
+
+    logger.info(
+        "Refreshed madrid_events for today (cinema + Taquilla shows): "
+        "inserted=%d updated=%d deleted=%d unchanged=%d skipped=%d failed=%d, "
+        "not modified: %s",
+        totals["inserted"],
+        totals["updated"],
+        totals["deleted"],
+        totals["unchanged"],
+        totals["skipped"],
+        totals["failed"],
+        ", ".join(sorted(unchanged)) or "-",
+    )
+
+    # Bot-ի category cache-ը պետք է տեսնի նոր տվյալները
+    invalidate_events_cache()
+
+
+# Կրճատված Taquilla էջեր benchmark-ների համար (միայն parser-ների կարդացած
+# markup-ը և մի քիչ շրջապատող էջ)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_PAGES = {
+    "cinema": os.path.join(FIXTURES_DIR, "taquilla_cartelera_madrid.html"),
+    "mosaic": os.path.join(FIXTURES_DIR, "taquilla_mosaic_madrid.html"),
+}
+
+
+def _read_fixture(page: str) -> str:
+    with open(FIXTURE_PAGES[page], encoding="utf-8") as f:
+        return f.read()
+
+
+def benchmark_parsers(
+    html: Optional[str] = None, page: str = "mosaic", runs: int = 20
+) -> None:
+    """
+    Համեմատում է parser backend-ները մեկ պահված էջի վրա՝ ժամանակ և peak memory,
+    և ստուգում, որ բոլորի արդյունքը նույնն է. html=None → FIXTURE_PAGES[page].
+      python -m backend.events_sources_madrid bench [page.html] [mosaic|cinema]
+    """
+    import time
+    import tracemalloc
+
+    if html is None:
+        html = _read_fixture(page)
+
+    if page == "cinema":
+        strainer = CINEMA_PAGE_STRAINER
+        extract = lambda soup: _cinema_events_from_soup(soup, 30)
+    else:
+        strainer = MOSAIC_PAGE_STRAINER
+        extract = lambda soup: _show_events_from_soup(soup, "bench", 20)
+
+    baseline = None
+    for parser in ("html.parser", "lxml"):
+        for label, parse_only in (("full", None), ("strainer", strainer)):
+            try:
+                events = extract(BeautifulSoup(html, parser, parse_only=parse_only))
+            except FeatureNotFound:
+                print(f"{parser:>12} {label:>9}: not installed")
+                continue
+            if baseline is None:
+                baseline = events
+
+            started = time.perf_counter()
+            for _ in range(runs):
+                extract(BeautifulSoup(html, parser, parse_only=parse_only))
+            elapsed = (time.perf_counter() - started) / runs
+
+            tracemalloc.start()
+            extract(BeautifulSoup(html, parser, parse_only=parse_only))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                f"{parser:>12} {label:>9}: {elapsed * 1000:8.2f} ms/page, "
+                f"peak {peak / 1024:8.0f} KiB, {len(events)} events, "
+                f"{'same' if events == baseline else 'DIFFERENT'} output"
+            )
 
-    # 🎭 Շոու / թատրոն / մյուզիքլ / kids / և այլն — յուրաքանչյուրից մինչև 20 event
-    for category_slug, url in TAQUILLA_SHOW_CATEGORIES.items():
-        shows = fetch_taquilla_show_category(url, category_slug, limit=20)
-        for ev in shows:
-            _save_event_to_db(ev)
 
-    logger.info("Refreshed madrid_events for today (cinema + Taquilla shows)")
+def benchmark_concurrent_fetch(pages: int = 11, delay_ms: float = 800) -> None:
+    """
+    Local stub HTTP server-ի վրա (ամեն էջը mosaic fixture-ն է) չափում է
+    էջերի քաշումը հաջորդաբար և refresh_madrid_events_for_today-ի նման
+    զուգահեռ (նույն executor, session, per-host limit). Էջ i-ն պատասխանում է delay_ms * (i + 1) / pages
+    ուշացումով, այսինքն ամենադանդաղը՝ delay_ms.
+    Զուգահեռ wall time-ը պետք է մոտ լինի ամենադանդաղ էջին (կամ,
+    եթե էջերը շատ են, per-host limit-ով հաշված սպասվող նվազագույնին).
+      python -m backend.events_sources_madrid bench-fetch [pages] [delay_ms]
+    """
+    import time
+    import heapq
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    delays = [delay_ms / 1000 * (i + 1) / pages for i in range(pages)]
+    body = _read_fixture("mosaic").encode("utf-8")
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            n = int(self.path.strip("/").split("/")[-1])
+            time.sleep(delays[n])
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    # Ամեն run-ը իր path-երով, որ HTTP cache-ը չխառնվի (stub-ը ETag չի տալիս)
+    urls = lambda run: [f"{base}/{run}/{n}" for n in range(pages)]
+
+    def fetch(url: str) -> List[Event]:
+        soup = _http_get(url, parse_only=MOSAIC_PAGE_STRAINER)
+        return _show_events_from_soup(soup, "bench", 20) if soup else []
 
+    try:
+        started = time.perf_counter()
+        sequential = [fetch(url) for url in urls("seq")]
+        sequential_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=SCRAPE_MAX_WORKERS) as executor:
+            futures = [executor.submit(fetch, url) for url in urls("par")]
+            concurrent = [future.result() for future in futures]
+        concurrent_s = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Սպասվող նվազագույնը՝ էջերը հերթով բաշխված min(workers, per-host) slot-երի վրա
+    slots = [0.0] * min(SCRAPE_MAX_WORKERS, SCRAPE_PER_HOST_LIMIT, pages)
+    for delay in delays:
+        heapq.heappush(slots, heapq.heappop(slots) + delay)
+    expected_s = max(slots)
+
+    fetched = sum(1 for events in concurrent if events)
+    print(
+        f"{pages} pages, slowest {max(delays) * 1000:.0f} ms, "
+        f"{SCRAPE_MAX_WORKERS} workers, {SCRAPE_PER_HOST_LIMIT} per host"
+    )
+    print(f"  sequential: {sequential_s * 1000:8.0f} ms (sum {sum(delays) * 1000:.0f} ms)")
+    print(f"  concurrent: {concurrent_s * 1000:8.0f} ms (expected ~{expected_s * 1000:.0f} ms)")
+    print(
+        f"  {fetched}/{pages} pages parsed, "
+        f"{'same' if concurrent == sequential else 'DIFFERENT'} output"
+    )
 
 if __name__ == "__main__":
-    refresh_madrid_events_for_today()
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-fetch":
+        args = sys.argv[2:4]
+        benchmark_concurrent_fetch(
+            int(args[0]) if args else 11, float(args[1]) if len(args) > 1 else 800
+        )
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        args = sys.argv[2:]
+        html = None
+        if args and args[0] not in FIXTURE_PAGES:
+            with open(args.pop(0), encoding="utf-8") as f:
+                html = f.read()
+        benchmark_parsers(html, args[0] if args else "mosaic")
+    else:
+        refresh_madrid_events_for_today()
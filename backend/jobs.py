@@ -2,10 +2,11 @@
 
 import logging
 import os
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List, Dict, Set, Tuple
+from typing import Iterable, Iterator, List, Dict, Set, Tuple
 
-import psycopg  # պետք է ավելացնես requirements.txt-ում
+from backend.pg_pool import pg_connection
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +20,11 @@ Match = Tuple[Job, Job]
 
 def _get_conn():
     """
-    Բացում է նոր PostgreSQL connection `JOBS_DB_URL`-ով.
+    Վերցնում է PostgreSQL connection ընդհանուր pool-ից (backend.pg_pool).
     """
     if not JOBS_DB_URL:
         raise RuntimeError("JOBS_DB_URL/DATABASE_URL is not set in environment")
-    return psycopg.connect(JOBS_DB_URL)
+    return pg_connection()
 
 
 # ======================== Schema init helpers ==========================
@@ -52,26 +53,77 @@ def init_jobs_schema() -> None:
         key        TEXT UNIQUE NOT NULL,
         created_at TIMESTAMPTZ NOT NULL DEFAULT now()
     );
+
+    CREATE TABLE IF NOT EXISTS madrid_job_matches (
+        id         SERIAL PRIMARY KEY,
+        request_id INTEGER NOT NULL REFERENCES madrid_jobs (id) ON DELETE CASCADE,
+        offer_id   INTEGER NOT NULL REFERENCES madrid_jobs (id) ON DELETE CASCADE,
+        score      INTEGER NOT NULL,              -- ընդհանուր բառերի քանակը
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        UNIQUE (request_id, offer_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_madrid_job_matches_created
+        ON madrid_job_matches (created_at DESC, id DESC);
     """
     try:
         with _get_conn() as conn, conn.cursor() as cur:
             cur.execute(sql)
+            cur.execute("SELECT EXISTS (SELECT 1 FROM madrid_job_matches);")
+            has_matches = cur.fetchone()[0]
         logger.info("madrid_jobs and madrid_posted tables ensured/initialized")
     except Exception as e:
         logger.error(f"Error initializing jobs schema: {e}", exc_info=True)
         raise
 
+    if not has_matches:
+        # Առաջին անգամ՝ լրացնում ենք match-երը արդեն եղած jobs-երից
+        rebuild_job_matches()
+
 
 # ======================== Core DB helpers ==============================
 
-def _insert_job(user, text: str, role: str) -> None:
+def _row_to_job(row) -> Job:
+    job_id, user_id, username, role, text, city, created_at = row
+    return {
+        "id": job_id,
+        "user_id": user_id,
+        "username": username,
+        "role": role,
+        "text": text,
+        "city": city,
+        "created_at": created_at.isoformat(),
+    }
+
+
+def _save_matches(matches: List[Tuple[Job, Job, int]]) -> int:
+    """
+    Պահում է (request, offer, score) match-երը madrid_job_matches-ում.
+    Կրկնվող զույգերը անտեսվում են (UNIQUE request_id, offer_id).
+    """
+    if not matches:
+        return 0
+    sql = """
+    INSERT INTO madrid_job_matches (request_id, offer_id, score)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (request_id, offer_id) DO NOTHING;
+    """
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.executemany(sql, [(req["id"], off["id"], score) for req, off, score in matches])
+    return len(matches)
+
+
+def _insert_job(user, text: str, role: str) -> List[Match]:
     """
     Ներքին helper՝ INSERT madrid_jobs.
     user – aiogram-ի User օրինակը կամ object, որ ունի id և username.
+    Նոր row-ը անմիջապես համեմատվում է հակառակ role-ի jobs-երի հետ,
+    և match-երը պահվում են madrid_job_matches-ում. Վերադարձնում է նոր match-երը.
     """
     sql = """
     INSERT INTO madrid_jobs (user_id, username, role, text)
-    VALUES (%(user_id)s, %(username)s, %(role)s, %(text)s);
+    VALUES (%(user_id)s, %(username)s, %(role)s, %(text)s)
+    RETURNING id, user_id, username, role, text, city, created_at;
     """
     params = {
         "user_id": int(getattr(user, "id", 0)),
@@ -82,11 +134,24 @@ def _insert_job(user, text: str, role: str) -> None:
     try:
         with _get_conn() as conn, conn.cursor() as cur:
             cur.execute(sql, params)
+            job = _row_to_job(cur.fetchone())
         logger.info("Inserted job (%s) from user_id=%s", role, params["user_id"])
     except Exception as e:
         logger.error(f"Error inserting job ({role}): {e}", exc_info=True)
         raise
 
+    try:
+        if role == "request":
+            found = list(_iter_matches([job], _fetch_jobs(role="offer")))
+        else:
+            found = list(_iter_matches(_fetch_jobs(role="request"), [job]))
+        _save_matches(found)
+        logger.info("Job %s (%s): %d new matches", job["id"], role, len(found))
+        return [(req, off) for req, off, _ in found]
+    except Exception as e:
+        logger.error(f"Error matching new job {job['id']}: {e}", exc_info=True)
+        return []
+
 
 def _fetch_jobs(role: str, days: int = 30) -> List[Job]:
     """
@@ -109,36 +174,58 @@ def _fetch_jobs(role: str, days: int = 30) -> List[Job]:
         logger.error(f"Error fetching jobs for role={role}: {e}", exc_info=True)
         return []
 
-    jobs: List[Job] = []
-    for job_id, user_id, username, role, text, city, created_at in rows:
-        jobs.append(
-            {
-                "id": job_id,
-                "user_id": user_id,
-                "username": username,
-                "role": role,
-                "text": text,
-                "city": city,
-                "created_at": created_at.isoformat(),
-            }
-        )
-    return jobs
+    return [_row_to_job(row) for row in rows]
 
 
 # ======================== Public API (offers/requests) =================
 
-def add_offer(user, text: str) -> None:
+def add_offer(user, text: str) -> List[Match]:
     """
     Add job offer – հիմա INSERT է անում madrid_jobs աղյուսակում.
+    Վերադարձնում է նոր գտնված match-երը.
     """
-    _insert_job(user, text, role="offer")
+    return _insert_job(user, text, role="offer")
 
 
-def add_request(user, text: str) -> None:
+def add_request(user, text: str) -> List[Match]:
     """
     Add job request – INSERT madrid_jobs-ում role='request'.
+    Վերադարձնում է նոր գտնված match-երը.
     """
-    _insert_job(user, text, role="request")
+    return _insert_job(user, text, role="request")
+
+
+def _job_words(job: Job) -> Set[str]:
+    return set(job["text"].lower().split())
+
+
+def _iter_matches(
+    requests: List[Job], offers: Iterable[Job]
+) -> Iterator[Tuple[Job, Job, int]]:
+    """
+    Yield (request, offer, common_words) զույգերը.
+    Կանոնը նույնն է՝ ≥2 ընդհանուր բառ, կամ ≥1 եթե request-ը ≤3 բառ է.
+    Offer-ների համար կառուցում ենք inverted index (բառ → offer index),
+    այնպես որ համեմատում ենք միայն ընդհանուր բառ ունեցող զույգերը.
+    """
+    offers = list(offers)
+    index: Dict[str, List[int]] = defaultdict(list)
+    for i, off in enumerate(offers):
+        for word in _job_words(off):
+            index[word].append(i)
+
+    for req in requests:
+        req_words = _job_words(req)
+        min_common = 1 if len(req_words) <= 3 else 2
+
+        common: Dict[int, int] = defaultdict(int)
+        for word in req_words:
+            for i in index.get(word, ()):
+                common[i] += 1
+
+        for i in sorted(common):
+            if common[i] >= min_common:
+                yield req, offers[i], common[i]
 
 
 def find_matches(days: int = 30) -> List[Match]:
@@ -150,18 +237,9 @@ def find_matches(days: int = 30) -> List[Match]:
         requests = _fetch_jobs(role="request", days=days)
         offers = _fetch_jobs(role="offer", days=days)
 
-        matches: List[Match] = []
-
-        for req in requests:
-            for off in offers:
-                req_words = set(req["text"].lower().split())
-                off_words = set(off["text"].lower().split())
-                common_words = req_words & off_words
-
-                if len(common_words) >= 2 or (
-                    len(common_words) >= 1 and len(req_words) <= 3
-                ):
-                    matches.append((req, off))
+        matches: List[Match] = [
+            (req, off) for req, off, _ in _iter_matches(requests, offers)
+        ]
 
         logger.info("Found %d matches", len(matches))
         return matches
@@ -170,4 +248,95 @@ def find_matches(days: int = 30) -> List[Match]:
         return []
 
 
+def get_matches(limit: int = 5, offset: int = 0, days: int = 30) -> List[Match]:
+    """
+    Պահված match-երը՝ նորերը առաջինը, էջավորված (limit/offset).
+    Index-ով կարդացում է, աղյուսակի չափից կախված չէ.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    sql = """
+    SELECT r.id, r.user_id, r.username, r.role, r.text, r.city, r.created_at,
+           o.id, o.user_id, o.username, o.role, o.text, o.city, o.created_at
+    FROM madrid_job_matches m
+    JOIN madrid_jobs r ON r.id = m.request_id
+    JOIN madrid_jobs o ON o.id = m.offer_id
+    WHERE m.created_at >= %(since)s
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT %(limit)s OFFSET %(offset)s;
+    """
+    params = {"since": since, "limit": limit, "offset": offset}
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+    except Exception as e:
+        logger.error(f"Error fetching job matches: {e}", exc_info=True)
+        return []
+
+    return [(_row_to_job(row[:7]), _row_to_job(row[7:])) for row in rows]
+
+
+def rebuild_job_matches(days: int = 30) -> int:
+    """
+    Ամբողջական վերահաշվարկ՝ վերջին `days` օրերի jobs-երից
+    (օգտագործվում է աղյուսակի առաջին լրացման համար).
+    """
+    try:
+        requests = _fetch_jobs(role="request", days=days)
+        offers = _fetch_jobs(role="offer", days=days)
+        saved = _save_matches(list(_iter_matches(requests, offers)))
+        logger.info("Rebuilt madrid_job_matches: %d matches", saved)
+        return saved
+    except Exception as e:
+        logger.error(f"Error rebuilding job matches: {e}", exc_info=True)
+        return 0
+
+
 # ======================== Posted items (anti-duplicate)
+
+
+if __name__ == "__main__":
+    # Benchmark: inverted index vs. the old pairwise loop.
+    #   python -m backend.jobs [n_requests] [n_offers]
+    # The pairwise loop is timed on a sample of requests and extrapolated.
+    import random
+    import sys
+    import time
+
+    n_req = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_off = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    rng = random.Random(42)
+    vocab = [f"w{i}" for i in range(5000)]
+
+    def _fake_jobs(n: int, role: str) -> List[Job]:
+        return [
+            {"id": i, "role": role, "text": " ".join(rng.choices(vocab, k=rng.randint(2, 15)))}
+            for i in range(n)
+        ]
+
+    reqs = _fake_jobs(n_req, "request")
+    offs = _fake_jobs(n_off, "offer")
+
+    started = time.perf_counter()
+    indexed = [(r["id"], o["id"]) for r, o, _ in _iter_matches(reqs, offs)]
+    t_indexed = time.perf_counter() - started
+
+    sample = reqs[: min(200, n_req)]
+    started = time.perf_counter()
+    pairwise = []
+    for req in sample:
+        for off in offs:
+            req_words = set(req["text"].lower().split())
+            off_words = set(off["text"].lower().split())
+            common_words = req_words & off_words
+            if len(common_words) >= 2 or (
+                len(common_words) >= 1 and len(req_words) <= 3
+            ):
+                pairwise.append((req["id"], off["id"]))
+    t_pairwise = (time.perf_counter() - started) * n_req / len(sample)
+
+    assert pairwise == indexed[: len(pairwise)], "indexed matcher disagrees"
+    print(f"{n_req} requests x {n_off} offers, {len(indexed)} matches")
+    print(f"  pairwise loop (extrapolated): {t_pairwise:8.2f} s")
+    print(f"  inverted index:               {t_indexed:8.2f} s")
+    print(f"  speed-up:                     {t_pairwise / t_indexed:8.1f}x")
@@ -26,6 +26,7 @@ LANG = {
 
 /start - Запустить бота
 /news - Новости Мадрида
+/traffic - Пробки на основных трассах
 /help - Показать эту справку
         """
     },
@@ -45,6 +46,7 @@ LANG = {
 
 /start - Iniciar el bot
 /news - Noticias de Madrid
+/traffic - Tráfico en las vías principales
 /help - Mostrar esta ayuda
         """
     },
@@ -64,6 +66,7 @@ LANG = {
 
 /start - Start the bot
 /news - Madrid news
+/traffic - Traffic on the main roads
 /help - Show this help
         """
     }
@@ -2,7 +2,8 @@
 
 import re
 import logging
-from backend.database import get_connection
+from datetime import datetime, timedelta
+from backend.database import db_connection
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
@@ -52,97 +53,105 @@ def parse_housing_offer(text):
         'text': text
     }
 
-def find_matching_requests(offer_data):
+def save_housing_listing(telegram_id, role, data):
+    """
+    Save parsed housing offer/request (parse_housing_offer output)
+    role: 'offer' or 'request'
+    """
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute("""
+                INSERT INTO housing_listings
+                    (telegram_id, role, type, price, rooms, location, message)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                telegram_id, role, data['type'], data['price'],
+                data['rooms'], data['location'], data['text']
+            ))
+        logger.info(f"Housing {role} saved for user {telegram_id}")
+        return cursor.lastrowid
+    except Exception as e:
+        logger.error(f"Error saving housing listing: {e}")
+        return None
+
+def _find_listings(role, data, price_op, rooms_op, days, exclude_telegram_id, limit):
+    """
+    Indexed lookup over housing_listings.
+    Location and type must match when known; price and rooms are compared
+    only when both sides specify them.
+    """
+    since = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    query = """
+        SELECT telegram_id, message, created_at, type, price, rooms, location
+        FROM housing_listings
+        WHERE role = ? AND created_at >= ?
+    """
+    params = [role, since]
+    
+    if data['location']:
+        query += " AND location = ?"
+        params.append(data['location'])
+    if data['type']:
+        query += " AND type = ?"
+        params.append(data['type'])
+    if data['price'] is not None:
+        query += f" AND (price IS NULL OR price {price_op} ?)"
+        params.append(data['price'])
+    if data['rooms'] is not None:
+        query += f" AND (rooms IS NULL OR rooms {rooms_op} ?)"
+        params.append(data['rooms'])
+    if exclude_telegram_id is not None:
+        query += " AND telegram_id != ?"
+        params.append(exclude_telegram_id)
+    
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    
+    with db_connection() as conn:
+        results = conn.execute(query, params).fetchall()
+    
+    return [
+        {
+            'user_id': user_id,
+            'message': message,
+            'timestamp': timestamp,
+            'type': housing_type,
+            'price': price,
+            'rooms': rooms,
+            'location': location
+        }
+        for user_id, message, timestamp, housing_type, price, rooms, location in results
+    ]
+
+def find_matching_requests(offer_data, days=30, exclude_telegram_id=None, limit=50):
     """
     Find all housing requests that match this offer
+    (budget >= offer price, wanted rooms <= offered rooms)
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    matches = []
-    
     try:
-        # Query for housing requests with similar parameters
-        query = "SELECT telegram_id, description, created_at FROM conversations WHERE "
-        conditions = []
-        params = []
-        
-        # Match by location
-        if offer_data['location']:
-            conditions.append("message LIKE ?")
-            params.append(f"%{offer_data['location']}%")
-        
-        # Match by housing keyword
-        conditions.append("message LIKE ?")
-        params.append("%квартира%")
-        
-        if conditions:
-            query += " AND ".join(conditions)
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            for user_id, message, timestamp in results:
-                matches.append({
-                    'user_id': user_id,
-                    'message': message,
-                    'timestamp': timestamp
-                })
-        
+        matches = _find_listings(
+            'request', offer_data, '>=', '<=', days, exclude_telegram_id, limit
+        )
         logger.info(f"Found {len(matches)} matching requests for offer")
         return matches
-    
     except Exception as e:
         logger.error(f"Error finding matches: {e}")
         return []
-    
-    finally:
-        conn.close()
 
-def find_matching_offers(request_data):
+def find_matching_offers(request_data, days=30, exclude_telegram_id=None, limit=50):
     """
     Find all housing offers that match this request
+    (price <= budget, rooms >= wanted rooms)
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    matches = []
-    
     try:
-        # Query for housing offers
-        query = "SELECT telegram_id, message, created_at FROM conversations WHERE "
-        conditions = []
-        params = []
-        
-        # Match by location
-        if request_data['location']:
-            conditions.append("message LIKE ?")
-            params.append(f"%{request_data['location']}%")
-        
-        # Match by housing keyword
-        conditions.append("message LIKE ?")
-        params.append("%сдается%")
-        
-        if conditions:
-            query += " AND ".join(conditions)
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            for user_id, message, timestamp in results:
-                matches.append({
-                    'user_id': user_id,
-                    'message': message,
-                    'timestamp': timestamp
-                })
-        
+        matches = _find_listings(
+            'offer', request_data, '<=', '>=', days, exclude_telegram_id, limit
+        )
         logger.info(f"Found {len(matches)} matching offers for request")
         return matches
-    
     except Exception as e:
         logger.error(f"Error finding matches: {e}")
         return []
-    
-    finally:
-        conn.close()
 
 def is_housing_offer(text):
     """Check if message is a housing offer"""
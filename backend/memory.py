@@ -2,16 +2,26 @@
 
 import re
 import logging
+import threading
 from collections import Counter
 from backend.database import (
-    save_conversation, 
-    get_user_conversations,
+    queue_conversation,
+    queue_user_preferences,
+    queue_interest_counts,
+    get_user_interest_counts,
     get_user_preferences,
-    update_user_preferences
 )
 
 logger = logging.getLogger(__name__)
 
+# Messages are analysed in the blocking thread pool, so two messages from the
+# same user can update preferences at once; a fixed set of striped locks keeps
+# each user's read-modify-write serialised without a lock per user
+_PREFERENCE_LOCKS = tuple(threading.Lock() for _ in range(64))
+
+def _preference_lock(telegram_id):
+    return _PREFERENCE_LOCKS[hash(telegram_id) % len(_PREFERENCE_LOCKS)]
+
 # Keywords to track
 FOOD_KEYWORDS = {
     'ru': ['ресторан', 'кафе', 'еда', 'кухня', 'повар', 'официант', 'пицца', 'суши', 'бургер'],
@@ -41,46 +51,101 @@ HOUSING_KEYWORDS = {
     'en': ['apartment', 'house', 'room', 'rent', 'rental']
 }
 
+def _build_keyword_index():
+    """
+    Flatten the keyword dictionaries into (position, category, value)
+    entries keyed by term. Position keeps the original dictionary order,
+    so results come out exactly as the old nested loops produced them.
+    """
+    sources = [
+        ('food', FOOD_KEYWORDS, False),
+        ('locations', LOCATION_KEYWORDS, True),
+        ('work', WORK_KEYWORDS, False),
+        ('housing', HOUSING_KEYWORDS, False),
+    ]
+    index = {}
+    position = 0
+    for category, groups, use_group_name in sources:
+        for group, words in groups.items():
+            for word in words:
+                value = group if use_group_name else word
+                index.setdefault(word, []).append((position, category, value))
+                position += 1
+    return index
+
+def _trie_pattern(terms):
+    """
+    Build a regex alternation shaped like a trie, so matching cost depends
+    on the length of the text, not on the number of terms.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def _pattern(node):
+        end = node.get('') is True
+        branches = [
+            re.escape(char) + _pattern(child)
+            for char, child in sorted(node.items())
+            if char != ''
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if end:
+            # Shorter term is a complete match too; greedy `?` prefers longer
+            return '(?:' + body + ')?'
+        return body
+
+    return _pattern(trie)
+
+_KEYWORD_INDEX = _build_keyword_index()
+
+# Every term that is a prefix of another term also matches wherever the
+# longer one does (terms may carry word endings: "ресторан" / "ресторане")
+_KEYWORD_PREFIXES = {
+    term: [other for other in _KEYWORD_INDEX if term.startswith(other)]
+    for term in _KEYWORD_INDEX
+}
+
+# Terms must start at a word boundary (\w covers Cyrillic and accented
+# Spanish letters); the end is left open for inflected forms. The
+# lookahead captures overlapping hits such as "busco trabajo" + "trabajo".
+_KEYWORD_RE = re.compile(
+    r'(?<!\w)(?=(' + _trie_pattern(_KEYWORD_INDEX) + r'))'
+)
+
 def extract_keywords(message):
     """Extract relevant keywords from message"""
-    message_lower = message.lower()
     keywords = {
         'food': [],
         'locations': [],
         'work': [],
         'housing': []
     }
-    
-    # Extract food keywords
-    for lang, words in FOOD_KEYWORDS.items():
-        for word in words:
-            if word in message_lower:
-                keywords['food'].append(word)
-    
-    # Extract location keywords
-    for location, variants in LOCATION_KEYWORDS.items():
-        for variant in variants:
-            if variant in message_lower:
-                keywords['locations'].append(location)
-    
-    # Extract work keywords
-    for lang, words in WORK_KEYWORDS.items():
-        for word in words:
-            if word in message_lower:
-                keywords['work'].append(word)
-    
-    # Extract housing keywords
-    for lang, words in HOUSING_KEYWORDS.items():
-        for word in words:
-            if word in message_lower:
-                keywords['housing'].append(word)
-    
+
+    matched = set()
+    for match in _KEYWORD_RE.finditer(message.lower()):
+        term = match.group(1)
+        if term not in matched:
+            matched.update(_KEYWORD_PREFIXES[term])
+
+    hits = sorted(
+        entry for term in matched for entry in _KEYWORD_INDEX[term]
+    )
+    for _, category, value in hits:
+        keywords[category].append(value)
+
     return keywords
 
 def save_message_with_analysis(telegram_id, message):
     """Save message and extract keywords"""
     keywords = extract_keywords(message)
-    save_conversation(telegram_id, message, keywords)
+    queue_conversation(telegram_id, message, keywords)
+    update_interest_counts(telegram_id, keywords)
     
     # Update user preferences based on keywords
     update_preferences(telegram_id, keywords)
@@ -90,55 +155,55 @@ def save_message_with_analysis(telegram_id, message):
 
 def update_preferences(telegram_id, new_keywords):
     """Update user preferences based on new keywords"""
-    current_prefs = get_user_preferences(telegram_id)
+    with _preference_lock(telegram_id):
+        current_prefs = get_user_preferences(telegram_id)
     
-    # Initialize if empty
-    if not current_prefs:
-        current_prefs = {
-            'food_interests': [],
-            'preferred_locations': [],
-            'work_interests': [],
-            'housing_interests': []
-        }
+        # Initialize if empty
+        if not current_prefs:
+            current_prefs = {
+                'food_interests': [],
+                'preferred_locations': [],
+                'work_interests': [],
+                'housing_interests': []
+            }
     
-    # Add new keywords (avoid duplicates)
-    for category, words in new_keywords.items():
-        pref_key = f"{category}_interests" if category != 'locations' else 'preferred_locations'
-        if pref_key not in current_prefs:
-            current_prefs[pref_key] = []
+        # Add new keywords (avoid duplicates)
+        for category, words in new_keywords.items():
+            pref_key = f"{category}_interests" if category != 'locations' else 'preferred_locations'
+            if pref_key not in current_prefs:
+                current_prefs[pref_key] = []
         
-        for word in words:
-            if word not in current_prefs[pref_key]:
-                current_prefs[pref_key].append(word)
+            known = set(current_prefs[pref_key])
+            for word in words:
+                if word not in known:
+                    known.add(word)
+                    current_prefs[pref_key].append(word)
     
-    update_user_preferences(telegram_id, current_prefs)
+        queue_user_preferences(telegram_id, current_prefs)
+
+def update_interest_counts(telegram_id, keywords):
+    """Increment per-user interest counters for one analysed message"""
+    counts = Counter(
+        (category, word)
+        for category, words in keywords.items()
+        for word in words
+    )
+    counts[('messages', '')] += 1
+    queue_interest_counts(telegram_id, counts.items())
 
 def get_user_profile(telegram_id):
     """Get comprehensive user profile"""
-    conversations = get_user_conversations(telegram_id, limit=100)
+    counts = get_user_interest_counts(telegram_id)
     preferences = get_user_preferences(telegram_id)
     
-    # Analyze conversation patterns
-    all_keywords = {
-        'food': [],
-        'locations': [],
-        'work': [],
-        'housing': []
-    }
-    
-    for conv in conversations:
-        if conv['keywords']:
-            for category, words in conv['keywords'].items():
-                all_keywords[category].extend(words)
-    
-    # Count frequency
+    messages = counts.get('messages')
     profile = {
         'preferences': preferences,
-        'top_food_interests': Counter(all_keywords['food']).most_common(5),
-        'top_locations': Counter(all_keywords['locations']).most_common(3),
-        'work_related': len(all_keywords['work']) > 0,
-        'housing_related': len(all_keywords['housing']) > 0,
-        'total_conversations': len(conversations)
+        'top_food_interests': counts.get('food', [])[:5],
+        'top_locations': counts.get('locations', [])[:3],
+        'work_related': bool(counts.get('work')),
+        'housing_related': bool(counts.get('housing')),
+        'total_conversations': messages[0][1] if messages else 0
     }
     
     return profile
@@ -167,3 +232,46 @@ def get_recommendations(telegram_id):
         recommendations.append("🏠 New housing options available in your areas")
     
     return recommendations
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: compiled matcher vs. the per-term substring loop,
+    # with the stock vocabulary and with a few thousand synthetic terms.
+    #   python -m backend.memory
+    import random
+    import string
+    import timeit
+
+    def _loop_extract(message, groups):
+        message_lower = message.lower()
+        return [word for words in groups for word in words if word in message_lower]
+
+    sample = (
+        "Привет! Ищу работу повара в ресторане в центре Мадрида, "
+        "también busco piso o habitación en Las Tablas, alquiler hasta 900€"
+    )
+    stock_groups = [
+        words
+        for source in (FOOD_KEYWORDS, LOCATION_KEYWORDS, WORK_KEYWORDS, HOUSING_KEYWORDS)
+        for words in source.values()
+    ]
+    rng = random.Random(42)
+    synthetic = [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        for _ in range(5000)
+    ]
+    big_groups = stock_groups + [synthetic]
+    big_re = re.compile(r'(?<!\w)(?=(' + _trie_pattern(
+        {w for words in big_groups for w in words}) + r'))')
+
+    runs = 2000
+    for label, loop_groups, regex in (
+        ("stock (%d terms)" % len(_KEYWORD_INDEX), stock_groups, _KEYWORD_RE),
+        ("large (%d terms)" % (len(_KEYWORD_INDEX) + len(synthetic)), big_groups, big_re),
+    ):
+        t_loop = timeit.timeit(lambda: _loop_extract(sample, loop_groups), number=runs)
+        t_re = timeit.timeit(lambda: list(regex.finditer(sample.lower())), number=runs)
+        print(
+            f"{label:>20}: loop {t_loop / runs * 1e6:8.1f} µs/msg, "
+            f"compiled {t_re / runs * 1e6:8.1f} µs/msg"
+        )
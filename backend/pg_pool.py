@@ -0,0 +1,84 @@
+# backend/pg_pool.py
+
+import os
+import logging
+import threading
+from typing import Optional
+
+from psycopg_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Նույն DSN-ը, ինչ events/jobs մոդուլներում
+PG_DSN = os.getenv("EVENTS_DB_URL") or os.getenv("DATABASE_URL")
+
+# Pool-ի կարգավորումներ (env-ով փոխելի)
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "5"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))         # վայրկյան՝ connection սպասելու
+PG_POOL_MAX_IDLE = float(os.getenv("PG_POOL_MAX_IDLE", "300"))      # idle connection-ը փակվում է
+PG_POOL_MAX_LIFETIME = float(os.getenv("PG_POOL_MAX_LIFETIME", "1800"))
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def _pool_kwargs() -> dict:
+    if not PG_DSN:
+        raise RuntimeError("EVENTS_DB_URL is not set (or DATABASE_URL missing)")
+    return {
+        "conninfo": PG_DSN,
+        "min_size": PG_POOL_MIN_SIZE,
+        "max_size": PG_POOL_MAX_SIZE,
+        "timeout": PG_POOL_TIMEOUT,
+        "max_idle": PG_POOL_MAX_IDLE,
+        "max_lifetime": PG_POOL_MAX_LIFETIME,
+        "open": False,
+    }
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Վերադարձնում է process-ի ընդհանուր sync pool-ը (ստեղծում է առաջին կանչի ժամանակ).
+    Connection-ները ստուգվում են տրամադրելուց առաջ (health check).
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    check=ConnectionPool.check_connection,
+                    name="madrid-pg",
+                    **_pool_kwargs(),
+                )
+                pool.open()
+                _pool = pool
+                logger.info(
+                    "PostgreSQL pool opened (min=%s, max=%s)",
+                    PG_POOL_MIN_SIZE,
+                    PG_POOL_MAX_SIZE,
+                )
+    return _pool
+
+
+def pg_connection():
+    """
+    Context manager՝ connection pool-ից.
+      with pg_connection() as conn, conn.cursor() as cur: ...
+    Դուրս գալիս commit է անում (կամ rollback error-ի դեպքում)
+    և connection-ը վերադարձնում pool.
+    """
+    return get_pool().connection()
+
+
+def close_pool() -> None:
+    """
+    Փակում է sync pool-ը (shutdown-ի ժամանակ).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            logger.info("PostgreSQL pool closed")
+
@@ -15,6 +15,7 @@ from backend.news import (
 )
 from backend.events import get_upcoming_cinema_events
 from backend.ai.traffic import madrid_morning_traffic
+from backend.aio import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +46,7 @@ async def send_morning_news(bot: Bot):
         )
 
         # 2) Кино — նույն քարտերով, ինչ «🎬 Кино» մենյուում
-        events = get_upcoming_cinema_events(limit=2)
+        events = await run_blocking(get_upcoming_cinema_events, limit=2)
 
         for e in events:
             title = (e.get("title") or "").strip()
@@ -98,7 +99,7 @@ async def send_morning_news(bot: Bot):
     try:
         # 3. Рестораны и бары (մինչև 2 event)
         try:
-            restaurants = build_restaurant_message(max_items=2)
+            restaurants = await run_blocking(build_restaurant_message, max_items=2)
         except Exception as e:
             logger.error("Error building restaurant block: %s", e, exc_info=True)
             restaurants = ""
@@ -108,7 +109,7 @@ async def send_morning_news(bot: Bot):
 
         # 4. Праздники и городские мероприятия (մինչև 2 event)
         try:
-            holidays = build_holidays_message(max_items=2)
+            holidays = await run_blocking(build_holidays_message, max_items=2)
         except Exception as e:
             logger.error("Error building holidays block: %s", e, exc_info=True)
             holidays = ""
@@ -118,7 +119,7 @@ async def send_morning_news(bot: Bot):
 
         # 5. Утренний трафик
         try:
-            traffic_msgs = madrid_morning_traffic()
+            traffic_msgs = await madrid_morning_traffic()
         except Exception as e:
             logger.error("Error building traffic messages: %s", e, exc_info=True)
             traffic_msgs = []
@@ -9,7 +9,7 @@ from backend.news import (
     build_restaurant_message,
     build_holidays_message,
 )
-from backend.database import get_db_connection, init_db
+from backend.database import db_connection, init_db, get_ai_answer_cache_stats
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -63,30 +63,29 @@ def api_news():
 @app.route("/api/stats")
 def api_stats():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Total users
-        cursor.execute("SELECT COUNT(DISTINCT telegram_id) FROM users")
-        total_users = cursor.fetchone()[0]
-
-        # Total messages
-        cursor.execute("SELECT COUNT(*) FROM conversations")
-        total_messages = cursor.fetchone()[0]
-
-        # Recent messages
-        cursor.execute(
-            """
-            SELECT telegram_id, message, timestamp
-            FROM conversations
-            ORDER BY timestamp DESC
-            LIMIT 10
-            """
-        )
-        recent_messages = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+
+            # Total users
+            cursor.execute("SELECT COUNT(DISTINCT telegram_id) FROM users")
+            total_users = cursor.fetchone()[0]
+
+            # Total messages
+            cursor.execute("SELECT COUNT(*) FROM conversations")
+            total_messages = cursor.fetchone()[0]
+
+            # Recent messages
+            cursor.execute(
+                """
+                SELECT telegram_id, message, timestamp
+                FROM conversations
+                ORDER BY timestamp DESC
+                LIMIT 10
+                """
+            )
+            recent_messages = cursor.fetchall()
+
+            cursor.close()
 
         return jsonify(
             {
@@ -102,6 +101,7 @@ def api_stats():
                         }
                         for msg in recent_messages
                     ],
+                    "ai_answer_cache": get_ai_answer_cache_stats(),
                 },
             }
         )